@@ -0,0 +1,206 @@
+from itertools import product
+
+from bitboard import (
+    BISHOP_DIRECTIONS,
+    ROOK_DIRECTIONS,
+    Position,
+    east,
+    iter_squares,
+    king_attacks,
+    knight_attacks,
+    north,
+    north_east,
+    north_west,
+    pawn_attacks,
+    sliding_attacks,
+    south,
+    south_east,
+    south_west,
+    west,
+)
+from pieces import BLACK_KING, BLACK_PIECES, WHITE_KING, WHITE_PIECES
+
+# Attack tables for the pieces whose reach doesn't depend on the rest of the
+# board. They are built once at import and indexed by square, so move
+# generation only has to mask out friendly pieces.
+KNIGHT_ATTACKS = [knight_attacks(1 << square) for square in range(64)]
+KING_ATTACKS = [king_attacks(1 << square) for square in range(64)]
+
+# indexed by [is_white][square]
+PAWN_ATTACKS = (
+    [pawn_attacks(1 << square, False) for square in range(64)],
+    [pawn_attacks(1 << square, True) for square in range(64)],
+)
+
+
+# Sliding pieces use PEXT-style lookups: only the squares a ray could be
+# blocked on matter (the board edge never blocks), so each square has a
+# relevance mask and a table mapping every subset of that mask to the
+# attack set. A lookup is then a single AND plus one hashed index, no
+# matter how crowded the board is.
+def _subsets(mask: int):
+    # enumerate every subset of mask (Carry-Rippler trick), empty set first
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            return
+
+
+def _slider_table(square: int, directions) -> tuple[int, dict[int, int]]:
+    # every direction is independent of the others, so build the per-ray
+    # (blockers, attacks) pairs first and combine them with a product,
+    # instead of walking four rays for each of the up to 4096 subsets
+    bit = 1 << square
+    rays = []
+    mask = 0
+    for step in directions:
+        ray_mask = 0
+        ray = step(bit)
+        while ray and step(ray):  # leave out the edge square
+            ray_mask |= ray
+            ray = step(ray)
+        mask |= ray_mask
+        rays.append(
+            [
+                (blockers, sliding_attacks(bit, blockers, (step,)))
+                for blockers in _subsets(ray_mask)
+            ]
+        )
+
+    table = {}
+    for (k0, a0), (k1, a1), (k2, a2), (k3, a3) in product(*rays):
+        table[k0 | k1 | k2 | k3] = a0 | a1 | a2 | a3
+    return mask, table
+
+
+def _slider_tables(directions) -> tuple[list[int], list[dict[int, int]]]:
+    masks, tables = [], []
+    for square in range(64):
+        mask, table = _slider_table(square, directions)
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+BISHOP_MASKS, BISHOP_TABLES = _slider_tables(BISHOP_DIRECTIONS)
+ROOK_MASKS, ROOK_TABLES = _slider_tables(ROOK_DIRECTIONS)
+
+
+def bishop_attacks(square: int, occupied: int) -> int:
+    return BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+
+
+def rook_attacks(square: int, occupied: int) -> int:
+    return ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+
+def queen_attacks(square: int, occupied: int) -> int:
+    return (
+        BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+        | ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+    )
+
+
+# Ray geometry between two squares, indexed [a][b] and 0 unless a and b
+# share a rank, file or diagonal:
+#   BETWEEN  the squares strictly between a and b
+#   LINE     the whole line through a and b, edge to edge
+# Blocking a check means moving onto BETWEEN[king][checker], and a pinned
+# piece may only move along LINE[king][piece].
+def _line_tables() -> tuple[list[list[int]], list[list[int]]]:
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    opposites = (
+        (north, south),
+        (east, west),
+        (north_east, south_west),
+        (north_west, south_east),
+    )
+    for square in range(64):
+        bit = 1 << square
+        for forward, backward in opposites:
+            full = (
+                sliding_attacks(bit, 0, (forward,))
+                | sliding_attacks(bit, 0, (backward,))
+                | bit
+            )
+            for step in (forward, backward):
+                passed = 0
+                ray = step(bit)
+                while ray:
+                    other = ray.bit_length() - 1
+                    between[square][other] = passed
+                    line[square][other] = full
+                    passed |= ray
+                    ray = step(ray)
+    return between, line
+
+
+BETWEEN, LINE = _line_tables()
+
+
+def is_square_attacked(position: Position, square: int, by_white: bool) -> bool:
+    # look outwards from the square with each piece's attack pattern and see
+    # if it lands on an attacker of that kind
+    bitboards = position.bitboards
+    if by_white:
+        pawns, knights, bishops, rooks, queens, king = (
+            bitboards[piece] for piece in WHITE_PIECES
+        )
+    else:
+        pawns, knights, bishops, rooks, queens, king = (
+            bitboards[piece] for piece in BLACK_PIECES
+        )
+    # a white pawn attacks the square if a black pawn on it would attack
+    # the pawn back, and vice versa
+    if PAWN_ATTACKS[not by_white][square] & pawns:
+        return True
+    if KNIGHT_ATTACKS[square] & knights or KING_ATTACKS[square] & king:
+        return True
+    occupied = position.occupied
+    if BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]] & (bishops | queens):
+        return True
+    return bool(ROOK_TABLES[square][occupied & ROOK_MASKS[square]] & (rooks | queens))
+
+
+def attack_map(position: Position, by_white: bool) -> int:
+    """Every square attacked by one side, as a bitboard.
+
+    Sliders see through the defending king, so a king in check can't escape
+    by stepping back along the checking ray. The map is cached on the
+    position under its hash: asking again before the next move, or after a
+    move has been taken back, costs nothing.
+    """
+    side = 1 if by_white else 0
+    key = position.hash
+    if position.attack_keys[side] == key:
+        return position.attack_maps[side]
+
+    bitboards = position.bitboards
+    if by_white:
+        pawns, knights, bishops, rooks, queens, king = (
+            bitboards[piece] for piece in WHITE_PIECES
+        )
+        defending_king = bitboards[BLACK_KING]
+    else:
+        pawns, knights, bishops, rooks, queens, king = (
+            bitboards[piece] for piece in BLACK_PIECES
+        )
+        defending_king = bitboards[WHITE_KING]
+
+    attacked = pawn_attacks(pawns, by_white)
+    for square in iter_squares(knights):
+        attacked |= KNIGHT_ATTACKS[square]
+    if king:
+        attacked |= KING_ATTACKS[king.bit_length() - 1]
+    occupied = position.occupied & ~defending_king
+    for square in iter_squares(bishops | queens):
+        attacked |= BISHOP_TABLES[square][occupied & BISHOP_MASKS[square]]
+    for square in iter_squares(rooks | queens):
+        attacked |= ROOK_TABLES[square][occupied & ROOK_MASKS[square]]
+
+    position.attack_keys[side] = key
+    position.attack_maps[side] = attacked
+    return attacked
@@ -0,0 +1,183 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from itertools import islice
+from typing import Iterable, Iterator
+
+from engine import MAX_DEPTH, Engine, move_to_notation, position_from_moves
+from fen import position_from_fen
+from progress import Progress
+from transposition import DEPTH_PREFERRED, TranspositionTable, add_hash_arguments
+
+# Batch analysis: every input line is one position, given either as a FEN or
+# as a line of coordinate moves from the starting position (an empty line is
+# the starting position itself). Positions are analysed by a pool of worker
+# processes and written out as JSON lines in input order, one per input line:
+#
+#   {"index": 0, "input": "e2e4 e7e5", "move": "g1f3", "score": 40, ...}
+#   {"index": 1, "input": "e2e5", "error": "Illegal move: e2e5"}
+#
+# Because the output is written in order and flushed line by line, it is also
+# the checkpoint: --resume counts the complete lines already written and
+# carries on from the next position.
+
+# one engine per worker process, set up by _start_worker
+_engine: Engine | None = None
+_depth = 3
+_movetime_ms: float | None = None
+
+
+def _start_worker(
+    megabytes: float, replacement: str, depth: int, movetime_ms: float | None
+) -> None:
+    global _engine, _depth, _movetime_ms
+    _engine = Engine(TranspositionTable(megabytes, replacement))
+    _depth = depth
+    _movetime_ms = movetime_ms
+
+
+def analyse(line: str) -> dict:
+    record: dict = {"input": line}
+    try:
+        if "/" in line:
+            position = position_from_fen(line)
+        else:
+            position = position_from_moves(line)
+    except ValueError as e:
+        record["error"] = str(e)
+        return record
+    # start every position from an empty table, so a result doesn't depend
+    # on which worker got it or what that worker analysed before
+    _engine.table.clear()
+    result = _engine.search(position, _depth, _movetime_ms)
+    record["move"] = move_to_notation(result.move) if result.move else None
+    record["score"] = result.score
+    record["depth"] = result.depth
+    record["nodes"] = result.nodes
+    record["pv"] = " ".join(move_to_notation(move) for move in result.pv)
+    return record
+
+
+def analyse_positions(
+    lines: Iterable[str],
+    workers: int,
+    depth: int = 3,
+    movetime_ms: float | None = None,
+    megabytes: float = 16,
+    replacement: str = DEPTH_PREFERRED,
+    first_index: int = 0,
+) -> Iterator[dict]:
+    """Analyse positions in parallel, yielding their records in input order.
+
+    Records are yielded as soon as they and everything before them are done,
+    so output can be streamed while later positions are still being
+    searched.
+    """
+    with multiprocessing.Pool(
+        workers,
+        initializer=_start_worker,
+        initargs=(megabytes, replacement, depth, movetime_ms),
+    ) as pool:
+        for index, record in enumerate(pool.imap(analyse, lines), first_index):
+            yield {"index": index, **record}
+
+
+def read_lines(source) -> Iterator[str]:
+    for line in source:
+        yield line.strip()
+
+
+def resume_point(path: str) -> int:
+    # number of complete records in an earlier run's output; a line cut off
+    # by a crash is removed so the run can append after the last good one
+    try:
+        with open(path, "rb+") as f:
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(complete)
+    except FileNotFoundError:
+        return 0
+    return data.count(b"\n", 0, complete)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a batch of positions")
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="-",
+        help="file with one FEN or line of moves per position (default: stdin)",
+    )
+    parser.add_argument("-o", "--output", help="JSON lines output (default: stdout)")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the positions already in --output and append the rest",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        help="search depth (default: 3, or unlimited with --movetime)",
+    )
+    parser.add_argument(
+        "--movetime", type=float, metavar="MS", help="time per position"
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="don't report progress on stderr"
+    )
+    add_hash_arguments(parser)
+    args = parser.parse_args()
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+
+    if args.depth is not None:
+        depth = args.depth
+    else:
+        depth = MAX_DEPTH if args.movetime is not None else 3
+
+    total = None
+    if args.input == "-":
+        source = sys.stdin
+    else:
+        with open(args.input) as f:
+            total = sum(1 for _ in f)
+        source = open(args.input)
+
+    skip = resume_point(args.output) if args.resume else 0
+    if args.output:
+        output = open(args.output, "a" if args.resume else "w")
+    else:
+        output = sys.stdout
+    progress = Progress(total, skip)
+    records = analyse_positions(
+        islice(read_lines(source), skip, None),
+        args.workers,
+        depth,
+        args.movetime,
+        args.hash,
+        args.hash_replace,
+        skip,
+    )
+    try:
+        for record in records:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            progress.done += 1
+            if not args.quiet:
+                progress.update()
+    except KeyboardInterrupt:
+        pass  # everything written so far is kept, --resume picks it up
+    finally:
+        if not args.quiet:
+            progress.update(finished=True)
+        if output is not sys.stdout:
+            output.close()
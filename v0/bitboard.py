@@ -0,0 +1,585 @@
+from evaluation import EG_TABLES, MG_TABLES, PHASES
+from moves import (
+    CAPTURE,
+    DOUBLE_PUSH,
+    EN_PASSANT,
+    KING_CASTLE,
+    PROMOTION,
+    QUEEN_CASTLE,
+    QUIET,
+    encode_move,
+)
+from pieces import (
+    BLACK,
+    BLACK_BISHOP,
+    BLACK_KING,
+    BLACK_KNIGHT,
+    BLACK_QUEEN,
+    BLACK_ROOK,
+    EMPTY,
+    GLYPHS,
+    KING,
+    PAWN,
+    PIECE_CODES,
+    ROOK,
+    TYPE_MASK,
+    WHITE_BISHOP,
+    WHITE_KING,
+    WHITE_KNIGHT,
+    WHITE_QUEEN,
+    WHITE_ROOK,
+)
+from type_defs import Board, BoardLoc
+from zobrist import (
+    BLACK_TO_MOVE_KEY,
+    CASTLING_KEYS,
+    EP_FILE_KEYS,
+    PIECE_KEYS,
+    compute_hash,
+)
+
+# Squares are numbered the same way a Board is indexed: row * 8 + column,
+# so a8 is square 0, h8 is square 7 and h1 is square 63. Bit n of a
+# bitboard is set when square n is part of the set.
+FULL = 0xFFFF_FFFF_FFFF_FFFF
+FILE_A = 0x0101_0101_0101_0101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = NOT_FILE_A & (NOT_FILE_A << 1)
+NOT_FILE_GH = NOT_FILE_H & (NOT_FILE_H >> 1)
+RANK_8 = 0xFF  # row 0
+RANK_2 = RANK_8 << 48  # row 6, where white pawns start
+RANK_7 = RANK_8 << 8  # row 1, where black pawns start
+
+# castling rights, stored as a 4 bit mask
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLING = 15
+NO_SQUARE = -1
+# flags of a swap_pieces entry on the undo stack, which no move has
+_SWAP = 16
+
+STARTING_BOARD: Board = [
+    ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # Rank 8
+    ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],  # Rank 7 (Black)
+    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 6
+    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 5
+    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 4
+    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 3
+    ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],  # Rank 2 (White)
+    ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # Rank 1
+]
+
+# promotion pieces by [is_white][flags & 3], see moves.py
+PROMOTION_PIECES = (
+    (BLACK_KNIGHT, BLACK_BISHOP, BLACK_ROOK, BLACK_QUEEN),
+    (WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN),
+)
+# promotion flag bits by piece type, anything else promotes to a queen
+_PROMOTION_KINDS = (3, 3, 0, 1, 2, 3, 3, 3)
+
+
+def loc_to_square(loc: BoardLoc) -> int:
+    return loc[0] * 8 + loc[1]
+
+
+def square_to_loc(square: int) -> BoardLoc:
+    return divmod(square, 8)
+
+
+# the rights that survive a move touching each square: moving a king or
+# rook off its home square (or capturing a rook on it) drops the right
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[0] ^= BLACK_QUEENSIDE  # a8
+CASTLING_MASKS[4] ^= BLACK_KINGSIDE | BLACK_QUEENSIDE  # e8
+CASTLING_MASKS[7] ^= BLACK_KINGSIDE  # h8
+CASTLING_MASKS[56] ^= WHITE_QUEENSIDE  # a1
+CASTLING_MASKS[60] ^= WHITE_KINGSIDE | WHITE_QUEENSIDE  # e1
+CASTLING_MASKS[63] ^= WHITE_KINGSIDE  # h1
+
+
+def iter_squares(bb: int):
+    # yields the square of every set bit, lowest first
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+# Single step shifts. North is towards rank 8 (row 0), so it shifts right.
+def north(bb: int) -> int:
+    return bb >> 8
+
+
+def south(bb: int) -> int:
+    return (bb << 8) & FULL
+
+
+def east(bb: int) -> int:
+    return (bb << 1) & NOT_FILE_A
+
+
+def west(bb: int) -> int:
+    return (bb >> 1) & NOT_FILE_H
+
+
+def north_east(bb: int) -> int:
+    return (bb >> 7) & NOT_FILE_A
+
+
+def north_west(bb: int) -> int:
+    return (bb >> 9) & NOT_FILE_H
+
+
+def south_east(bb: int) -> int:
+    return (bb << 9) & NOT_FILE_A
+
+
+def south_west(bb: int) -> int:
+    return (bb << 7) & NOT_FILE_H & FULL
+
+
+BISHOP_DIRECTIONS = (north_east, north_west, south_east, south_west)
+ROOK_DIRECTIONS = (north, south, east, west)
+
+
+def knight_attacks(bb: int) -> int:
+    return (
+        ((bb >> 17) & NOT_FILE_H)  # up 2, left 1
+        | ((bb >> 15) & NOT_FILE_A)  # up 2, right 1
+        | ((bb >> 10) & NOT_FILE_GH)  # up 1, left 2
+        | ((bb >> 6) & NOT_FILE_AB)  # up 1, right 2
+        | ((bb << 6) & NOT_FILE_GH)  # down 1, left 2
+        | ((bb << 10) & NOT_FILE_AB)  # down 1, right 2
+        | ((bb << 15) & NOT_FILE_H)  # down 2, left 1
+        | ((bb << 17) & NOT_FILE_A)  # down 2, right 1
+    ) & FULL
+
+
+def king_attacks(bb: int) -> int:
+    row = bb | east(bb) | west(bb)
+    return (row | north(row) | south(row)) ^ bb
+
+
+def pawn_attacks(bb: int, is_white: bool) -> int:
+    if is_white:
+        return north_east(bb) | north_west(bb)
+    return south_east(bb) | south_west(bb)
+
+
+def sliding_attacks(bb: int, occupied: int, directions) -> int:
+    # walk each ray until it leaves the board or hits a piece (inclusive)
+    attacks = 0
+    for step in directions:
+        ray = step(bb)
+        while ray:
+            attacks |= ray
+            if ray & occupied:
+                break
+            ray = step(ray)
+    return attacks
+
+
+class Position:
+    """A chess position stored as one 64-bit bitboard per piece (pieces.py).
+
+    Alongside the per-piece bitboards the position keeps occupancy masks for
+    each color and for the whole board, plus a 64 entry mailbox so the piece
+    on a given square can be read without testing every bitboard.
+
+    Moves are applied with make_move and taken back with unmake_move. Each
+    make_move pushes a small tuple with everything the move destroys
+    (captured piece, castling rights, en passant square, hash) onto an
+    undo stack, so searches can walk the tree without copying the board.
+
+    The position's Zobrist hash is kept in `hash` and updated by XOR on
+    every change, giving an O(1) key for caches and repetition checks.
+    The evaluation sums (mg, eg, phase, see evaluation.py) are maintained
+    the same way, so the static evaluation never has to scan the board.
+    """
+
+    __slots__ = (
+        "bitboards",
+        "white",
+        "black",
+        "occupied",
+        "squares",
+        "white_to_move",
+        "castling",
+        "ep_square",
+        "halfmove_clock",
+        "fullmove_number",
+        "hash",
+        "mg",
+        "eg",
+        "phase",
+        "attack_keys",
+        "attack_maps",
+        "pin_keys",
+        "pins",
+        "history",
+    )
+
+    def __init__(self) -> None:
+        # one bitboard per piece code, see pieces.py
+        self.bitboards: list[int] = [0] * 16
+        self.white = 0
+        self.black = 0
+        self.occupied = 0
+        self.squares: list[int] = [EMPTY] * 64
+        self.white_to_move = True
+        self.castling = 0
+        self.ep_square = NO_SQUARE
+        # plies since the last capture or pawn move, and the move number,
+        # which goes up after every black move
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash = 0
+        self.mg = 0
+        self.eg = 0
+        self.phase = 0
+        # attacks.attack_map's cache, indexed by [is_white]: the hash the map
+        # was computed for, and the map
+        self.attack_keys = [-1, -1]
+        self.attack_maps = [0, 0]
+        # movegen.pins_and_evasions's cache, the same way
+        self.pin_keys = [-1, -1]
+        self.pins = [(0, 0, 0), (0, 0, 0)]
+        # undo stack of (move, moved, captured, castling, ep_square,
+        # halfmove_clock, hash, mg, eg, phase), move packed as in moves.py or
+        # a swap_pieces entry
+        self.history: list[tuple[int, ...]] = []
+
+    @classmethod
+    def from_board(
+        cls,
+        board: Board,
+        white_to_move: bool = True,
+        castling: int | None = None,
+        ep_square: int = NO_SQUARE,
+    ) -> "Position":
+        position = cls()
+        for row in range(8):
+            for col in range(8):
+                piece = PIECE_CODES[board[row][col]]
+                if piece != EMPTY:
+                    position.put_piece(row * 8 + col, piece)
+        position.white_to_move = white_to_move
+        if castling is None:
+            # a Board doesn't record castling rights, so assume every king
+            # and rook still on its home square hasn't moved yet
+            castling = position.castling_from_placement()
+        position.castling = castling
+        position.ep_square = ep_square
+        position.hash = compute_hash(position)
+        return position
+
+    def castling_from_placement(self) -> int:
+        # the castling rights the kings and rooks on their home squares allow
+        rights = 0
+        squares = self.squares
+        if squares[60] == WHITE_KING:
+            if squares[63] == WHITE_ROOK:
+                rights |= WHITE_KINGSIDE
+            if squares[56] == WHITE_ROOK:
+                rights |= WHITE_QUEENSIDE
+        if squares[4] == BLACK_KING:
+            if squares[7] == BLACK_ROOK:
+                rights |= BLACK_KINGSIDE
+            if squares[0] == BLACK_ROOK:
+                rights |= BLACK_QUEENSIDE
+        return rights
+
+    def to_board(self) -> Board:
+        # the glyph board the UI draws, this is where pieces get their glyphs
+        glyphs = [GLYPHS[piece] for piece in self.squares]
+        return [glyphs[row * 8 : row * 8 + 8] for row in range(8)]
+
+    def piece_at(self, loc: BoardLoc) -> int:
+        return self.squares[loc[0] * 8 + loc[1]]
+
+    def put_piece(self, square: int, piece: int) -> None:
+        if piece == EMPTY:
+            # code 0 would otherwise be filed as a white piece
+            raise ValueError("Can't put an empty square on the board")
+        bit = 1 << square
+        self.bitboards[piece] |= bit
+        if piece & BLACK:
+            self.black |= bit
+        else:
+            self.white |= bit
+        self.occupied |= bit
+        self.squares[square] = piece
+        self.hash ^= PIECE_KEYS[piece][square]
+        self.mg += MG_TABLES[piece][square]
+        self.eg += EG_TABLES[piece][square]
+        self.phase += PHASES[piece]
+
+    def remove_piece(self, square: int) -> int:
+        piece = self.squares[square]
+        if piece != EMPTY:
+            mask = FULL ^ (1 << square)
+            self.bitboards[piece] &= mask
+            self.white &= mask
+            self.black &= mask
+            self.occupied &= mask
+            self.squares[square] = EMPTY
+            self.hash ^= PIECE_KEYS[piece][square]
+            self.mg -= MG_TABLES[piece][square]
+            self.eg -= EG_TABLES[piece][square]
+            self.phase -= PHASES[piece]
+        return piece
+
+    def encode_move(self, start: int, end: int, promotion: int = EMPTY) -> int:
+        """Pack the move from start to end into a moves.py integer.
+
+        Castling (the king moving two squares), en passant (a pawn moving
+        onto the en passant square), double pushes and promotion (a pawn
+        reaching the last rank, to a queen unless another piece is given)
+        are recognised from the move itself.
+        """
+        squares = self.squares
+        kind = squares[start] & TYPE_MASK
+        flags = QUIET if squares[end] == EMPTY else CAPTURE
+        if kind == PAWN:
+            if end == self.ep_square:
+                flags = EN_PASSANT
+            elif end - start == 16 or start - end == 16:
+                flags = DOUBLE_PUSH
+            elif end < 8 or end >= 56:
+                flags |= PROMOTION | _PROMOTION_KINDS[promotion & TYPE_MASK]
+        elif kind == KING and (end - start == 2 or start - end == 2):
+            flags = KING_CASTLE if end > start else QUEEN_CASTLE
+        return encode_move(start, end, flags)
+
+    def make_move(self, start: int, end: int, promotion: int = EMPTY) -> int:
+        """Move the piece on start to end and return whatever was captured.
+
+        A convenience for callers with squares in hand; see encode_move for
+        how the kind of move is worked out.
+        """
+        return self.make(self.encode_move(start, end, promotion))
+
+    def make(self, move: int) -> int:
+        """Play a packed move and return whatever was captured."""
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        squares = self.squares
+        bitboards = self.bitboards
+        moved = squares[start]
+        target = squares[end]
+        castling = self.castling
+        ep_square = self.ep_square
+
+        captured = target
+        # checked before anything changes, so a bad move leaves the position
+        # as it was
+        if flags == EN_PASSANT:
+            # the captured pawn sits behind the en passant square, not on it
+            victim = end - 8 if moved & BLACK else end + 8
+            captured = squares[victim]
+            if captured != moved ^ BLACK:
+                raise ValueError("No pawn to capture en passant")
+        elif flags == KING_CASTLE or flags == QUEEN_CASTLE:
+            corner = start + 3 if flags == KING_CASTLE else start - 4
+            if squares[corner] != moved & BLACK | ROOK:
+                raise ValueError("No rook to castle with")
+        self.history.append(
+            (
+                move,
+                moved,
+                captured,
+                castling,
+                ep_square,
+                self.halfmove_clock,
+                self.hash,
+                self.mg,
+                self.eg,
+                self.phase,
+            )
+        )
+        if flags == EN_PASSANT:
+            self.remove_piece(victim)
+
+        start_bit = 1 << start
+        end_bit = 1 << end
+        move_bits = start_bit | end_bit
+        bitboards[moved] ^= move_bits
+        if self.white & start_bit:
+            self.white ^= move_bits
+            if target != EMPTY:
+                bitboards[target] ^= end_bit
+                self.black ^= end_bit
+        else:
+            self.black ^= move_bits
+            if target != EMPTY:
+                bitboards[target] ^= end_bit
+                self.white ^= end_bit
+        self.occupied = self.white | self.black
+        squares[end] = moved
+        squares[start] = EMPTY
+
+        keys = PIECE_KEYS[moved]
+        self.hash ^= keys[start] ^ keys[end] ^ BLACK_TO_MOVE_KEY
+        mg_table = MG_TABLES[moved]
+        eg_table = EG_TABLES[moved]
+        self.mg += mg_table[end] - mg_table[start]
+        self.eg += eg_table[end] - eg_table[start]
+        if target != EMPTY:
+            self.hash ^= PIECE_KEYS[target][end]
+            self.mg -= MG_TABLES[target][end]
+            self.eg -= EG_TABLES[target][end]
+            self.phase -= PHASES[target]
+
+        if flags & PROMOTION:
+            self.remove_piece(end)
+            self.put_piece(end, PROMOTION_PIECES[not moved & BLACK][flags & 3])
+        elif flags == KING_CASTLE:
+            # the rook jumps over to the other side of the king
+            self.put_piece(start + 1, self.remove_piece(start + 3))
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(start - 1, self.remove_piece(start - 4))
+
+        key = self.hash
+        self.castling = castling & CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        if self.castling != castling:
+            key ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[self.castling]
+        if ep_square != NO_SQUARE:
+            key ^= EP_FILE_KEYS[ep_square & 7]
+        if flags == DOUBLE_PUSH:
+            self.ep_square = (start + end) // 2
+            key ^= EP_FILE_KEYS[start & 7]
+        else:
+            self.ep_square = NO_SQUARE
+        self.hash = key
+        self.white_to_move = not self.white_to_move
+        if captured != EMPTY or moved & TYPE_MASK == PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if moved & BLACK:
+            self.fullmove_number += 1
+        return captured
+
+    def unmake_move(self) -> None:
+        """Take back the last move, restoring the position exactly."""
+        (
+            move,
+            moved,
+            captured,
+            castling,
+            ep_square,
+            self.halfmove_clock,
+            key,
+            mg,
+            eg,
+            phase,
+        ) = self.history.pop()
+        start = move & 63
+        end = move >> 6 & 63
+        flags = move >> 12
+        self.castling = castling
+        self.ep_square = ep_square
+        if flags == _SWAP:
+            self._swap(start, end)
+            self.hash = key
+            self.mg = mg
+            self.eg = eg
+            self.phase = phase
+            return
+        self.white_to_move = not self.white_to_move
+
+        if flags & PROMOTION:
+            # turn the piece back into a pawn
+            self.remove_piece(end)
+            self.put_piece(end, moved)
+        elif flags == KING_CASTLE:
+            self.put_piece(start + 3, self.remove_piece(start + 1))
+        elif flags == QUEEN_CASTLE:
+            self.put_piece(start - 4, self.remove_piece(start - 1))
+
+        squares = self.squares
+        bitboards = self.bitboards
+        move_bits = (1 << start) | (1 << end)
+        bitboards[moved] ^= move_bits
+        if self.white & move_bits:
+            self.white ^= move_bits
+        else:
+            self.black ^= move_bits
+        self.occupied = self.white | self.black
+        squares[start] = moved
+        squares[end] = EMPTY
+        if moved & BLACK:
+            self.fullmove_number -= 1
+
+        if flags == EN_PASSANT:
+            self.put_piece(end - 8 if moved & BLACK else end + 8, captured)
+        elif captured != EMPTY:
+            self.put_piece(end, captured)
+        self.hash = key
+        self.mg = mg
+        self.eg = eg
+        self.phase = phase
+
+    def swap_pieces(self, first: int, second: int) -> None:
+        # not a chess move: used by the debug teleport command. It goes on
+        # the undo stack like one, so unmake_move swaps back and the moves
+        # before it can still be taken back. The side to move stays, the
+        # en passant square goes (the double push is no longer the last
+        # move) and so do the castling rights the new placement rules out
+        castling = self.castling
+        ep_square = self.ep_square
+        self.history.append(
+            (
+                first | second << 6 | _SWAP << 12,
+                EMPTY,
+                EMPTY,
+                castling,
+                ep_square,
+                self.halfmove_clock,
+                self.hash,
+                self.mg,
+                self.eg,
+                self.phase,
+            )
+        )
+        self._swap(first, second)
+        self.castling &= self.castling_from_placement()
+        if self.castling != castling:
+            self.hash ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[self.castling]
+        if ep_square != NO_SQUARE:
+            self.hash ^= EP_FILE_KEYS[ep_square & 7]
+            self.ep_square = NO_SQUARE
+
+    def _swap(self, first: int, second: int) -> None:
+        a = self.remove_piece(first)
+        b = self.remove_piece(second)
+        if b != EMPTY:
+            self.put_piece(first, b)
+        if a != EMPTY:
+            self.put_piece(second, a)
+
+    def friendly(self, is_white: bool) -> int:
+        return self.white if is_white else self.black
+
+    def enemy(self, is_white: bool) -> int:
+        return self.black if is_white else self.white
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (
+            self.hash == other.hash
+            and self.squares == other.squares
+            and self.white_to_move == other.white_to_move
+            and self.castling == other.castling
+            and self.ep_square == other.ep_square
+        )
+
+    def __repr__(self) -> str:
+        rows = ("".join(row) for row in self.to_board())
+        return f"Position({'/'.join(rows)})"
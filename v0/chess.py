@@ -1,70 +1,145 @@
-from logic_check import is_valid_move, get_possible_moves
-from type_defs import Board
+import argparse
+
+from engine import (
+    Engine,
+    ParallelEngine,
+    add_engine_arguments,
+    engine_from_args,
+    move_to_notation,
+    search_depth,
+)
+from fen import STARTING_FEN, position_from_fen
+from logic_check import PreviewCache, is_valid_move
+from movegen import has_legal_move, is_in_check
+from render import Renderer
 from utils import (
-    clear_screen,
+    FG_RED,
+    RESET,
+    format_board,
+    format_possible_moves,
     notation_to_loc,
     move_piece,
     parse_move,
-    print_board,
-    print_colored_board,
-    print_possible_moves,
     teleport_piece,
 )
 
-board: Board = [
-    ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # Rank 8
-    ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],  # Rank 7 (Black)
-    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 6
-    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 5
-    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 4
-    [".", ".", ".", ".", ".", ".", ".", "."],  # Rank 3
-    ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],  # Rank 2 (White)
-    ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # Rank 1
-]
+position = position_from_fen(STARTING_FEN)
 
 
-def play_game():
-    is_white_turn = True
+def play_game(
+    engine: Engine | ParallelEngine | None = None,
+    engine_plays_white: bool = False,
+    depth: int = 3,
+    movetime_ms: float | None = None,
+    clock_ms: float | None = None,
+    increment_ms: float = 0,
+):
     error_msg = ""
     last_move = ""
+    engine_info = ""
+    table_info = ""
+    renderer = Renderer()
+    preview = PreviewCache()
 
     while True:
-        clear_screen()
+        is_white_turn = position.white_to_move
+        # without a legal move the game is over, by checkmate or stalemate
+        game_over = not has_legal_move(position)
+        if (
+            engine is not None
+            and is_white_turn == engine_plays_white
+            and not game_over
+        ):
+            result = engine.search(
+                position, depth, movetime_ms, clock_ms, increment_ms
+            )
+            if clock_ms is not None:
+                clock_ms += increment_ms - result.seconds * 1000
+            if result.move is not None:
+                move_piece(position, *result.move)
+                last_move = move_to_notation(result.move)
+                pv = " ".join(move_to_notation(move) for move in result.pv)
+                nps = result.nodes / result.seconds if result.seconds else 0
+                engine_info = (
+                    f"depth {result.depth} score {result.score} "
+                    f"nodes {result.nodes} ({nps:.0f}/s) "
+                    f"time {result.seconds:.2f}s pv {pv}"
+                )
+                if clock_ms is not None:
+                    engine_info += f" clock {max(clock_ms, 0) / 1000:.1f}s"
+                table_info = engine.table.stats()
+                continue
+            error_msg = "Engine has no legal moves"
+
+        board = position.to_board()
 
+        # the whole frame is built first and drawn in one go, rewriting only
+        # the lines that changed since the last one
         if len(last_move) == 2:  # Preview mode
             try:
                 start = notation_to_loc(last_move)
                 piece = board[start[0]][start[1]]
                 if piece != ".":
-                    possible_moves = get_possible_moves(board, start)
-                    print_colored_board(board, start, possible_moves)
-                    print_possible_moves(last_move, possible_moves)
+                    possible_moves = preview.get_possible_moves(position, start)
+                    lines = format_board(board, start, possible_moves)
+                    lines += format_possible_moves(last_move, possible_moves)
                 else:
-                    print_board(board)
+                    lines = format_board(board)
                     error_msg = "Empty square selected"
             except (ValueError, IndexError):
-                print_board(board)
+                lines = format_board(board)
                 error_msg = "Invalid square"
         else:
-            print_board(board)
+            lines = format_board(board)
 
-        print(f"\nCurrent turn: {'White' if is_white_turn else 'Black'}")
-        print(f"Last Move: \033[38;5;208m{last_move}\033[0m")
+        lines += ["", f"Current turn: {'White' if is_white_turn else 'Black'}"]
+        if game_over and is_in_check(position):
+            winner = "Black" if is_white_turn else "White"
+            lines.append(f"{FG_RED}Checkmate!{RESET} {winner} wins")
+        elif game_over:
+            lines.append("Stalemate, the game is drawn")
+        elif is_in_check(position):
+            lines.append(f"{FG_RED}Check!{RESET}")
+        lines.append(f"Last Move: \033[38;5;208m{last_move}\033[0m")
+        if engine_info:
+            lines.append(f"Engine: {engine_info}")
+            lines.append(f"        {table_info}")
         if error_msg:
-            print(f"Error: {error_msg}")
+            lines.append(f"Error: {error_msg}")
             error_msg = ""
+        renderer.draw(lines)
+        if game_over:
+            break
 
         move = input(
-            "\nYour move (e.g., e2e4, e2 for preview, or 'q' or 'quit' to exit): "
+            "\nYour move (e.g., e2e4, e2 for preview, 'u' to undo, "
+            "or 'q' or 'quit' to exit): "
         ).lower()
         if move == "quit" or move == "q":
             break
 
+        if move == "undo" or move == "u":
+            if position.history:
+                position.unmake_move()
+                # take back the engine's reply too, so it's our turn again
+                # (a teleport is taken back on its own, it doesn't pass the
+                # turn)
+                if (
+                    engine is not None
+                    and position.history
+                    and position.white_to_move == engine_plays_white
+                ):
+                    position.unmake_move()
+            else:
+                error_msg = "Nothing to undo"
+            last_move = ""
+            continue
+
         last_move = move
         if move.startswith(";") and len(move) == 5:
             try:
                 start, end = parse_move(move[1:])
-                teleport_piece(board, start, end)
+                teleport_piece(position, start, end)
                 continue
             except (ValueError, IndexError) as e:
                 error_msg = f"Invalid teleport: {e}"
@@ -73,11 +148,37 @@ def play_game():
         if len(move) == 4:  # Regular move
             try:
                 start, end = parse_move(move)
-                if is_valid_move(board, start, end, is_white_turn):
-                    move_piece(board, start, end)
-                    is_white_turn = not is_white_turn
+                if is_valid_move(position, start, end, is_white_turn):
+                    move_piece(position, start, end)
             except ValueError as e:
                 error_msg = str(e)
 
 
-play_game()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play tanuki in the terminal")
+    parser.add_argument(
+        "--ai",
+        choices=("white", "black"),
+        help="let the engine play this side",
+    )
+    parser.add_argument("--fen", default=STARTING_FEN, help="start from this position")
+    add_engine_arguments(parser)
+    args = parser.parse_args()
+    try:
+        position = position_from_fen(args.fen)
+    except ValueError as e:
+        parser.error(str(e))
+
+    engine = engine_from_args(args) if args.ai else None
+    try:
+        play_game(
+            engine,
+            args.ai == "white",
+            search_depth(args),
+            args.movetime,
+            args.clock * 1000 if args.clock is not None else None,
+            args.increment * 1000,
+        )
+    finally:
+        if engine is not None:
+            engine.close()
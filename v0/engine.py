@@ -0,0 +1,626 @@
+import argparse
+import multiprocessing
+import pickle
+import time
+from typing import Callable, Iterator, NamedTuple
+
+from bitboard import PROMOTION_PIECES, STARTING_BOARD, Position, square_to_loc
+from evaluation import evaluate
+from movegen import generate_captures, generate_moves, is_in_check
+from moves import CAPTURE, EN_PASSANT, MAX_PLY, PROMOTION
+from pieces import EMPTY, PAWN, PIECE_TYPES, TYPE_LETTERS, TYPE_MASK
+from transposition import (
+    DEPTH_PREFERRED,
+    EXACT,
+    LOWER,
+    UPPER,
+    SharedTranspositionTable,
+    TranspositionTable,
+    add_hash_arguments,
+    table_from_args,
+)
+from type_defs import BoardLoc
+from utils import loc_to_notation
+
+MATE = 30000
+INFINITY = 32000
+MATE_BOUND = MATE - 1000  # scores above this are mates in some number of plies
+MAX_DEPTH = 64
+CHECK_EVERY = 255  # look at the clock every 256 nodes
+
+# used for move ordering, indexed by piece code; evaluation.py has the values
+# the search scores with
+PIECE_VALUES = tuple(
+    (0, 100, 320, 330, 500, 900, 0)[piece_type] for piece_type in PIECE_TYPES
+)
+# knight, bishop, rook and queen, indexed like the promotion flags
+PROMOTION_VALUES = (320, 330, 500, 900)
+
+# (start, end, promotion piece or EMPTY), the arguments of utils.move_piece
+EngineMove = tuple[BoardLoc, BoardLoc, int]
+
+
+class SearchResult(NamedTuple):
+    move: EngineMove | None
+    score: int  # centipawns from the side to move's point of view
+    pv: list[EngineMove]
+    depth: int
+    nodes: int
+    seconds: float
+
+
+def move_to_notation(move: EngineMove) -> str:
+    # coordinate notation, with the promotion piece appended: e7e8q
+    return (
+        loc_to_notation(move[0])
+        + loc_to_notation(move[1])
+        + TYPE_LETTERS[move[2] & TYPE_MASK]
+    )
+
+
+def to_engine_move(position: Position, move: int) -> EngineMove:
+    # unpack a move of the side to move in position
+    promotion = EMPTY
+    if move >> 12 & PROMOTION:
+        promotion = PROMOTION_PIECES[position.white_to_move][move >> 12 & 3]
+    return square_to_loc(move & 63), square_to_loc(move >> 6 & 63), promotion
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget runs out."""
+
+
+def time_budget(
+    movetime_ms: float | None = None,
+    clock_ms: float | None = None,
+    increment_ms: float = 0,
+) -> float | None:
+    # milliseconds to spend on this move, None for no limit. With a game
+    # clock, spend a slice of what's left plus most of the increment, but
+    # never more than half the remaining time
+    if movetime_ms is not None:
+        return movetime_ms
+    if clock_ms is not None:
+        return min(clock_ms / 30 + increment_ms * 0.75, clock_ms / 2)
+    return None
+
+
+class Engine:
+    """Alpha-beta (negamax) search over every move for the side to move.
+
+    Results are cached in a transposition table shared between searches, and
+    moves are ordered hash move first, then captures by most valuable victim /
+    least valuable attacker, so most cutoffs happen on the first move tried.
+    Leaves are resolved with a captures-only quiescence search.
+
+    Searches run with iterative deepening: depth 1, 2, 3, ... until the depth
+    limit or the time budget is reached. Each iteration leaves its best line
+    in the transposition table, where the next iteration picks it up as the
+    hash move at every node along the line, so the deeper search starts with
+    the previous principal variation. When time runs out mid-iteration the
+    partial result is thrown away and the last completed depth is returned.
+    """
+
+    def __init__(self, table: TranspositionTable | None = None) -> None:
+        self.table = table if table is not None else TranspositionTable()
+        self.nodes = 0
+        self.deadline: float | None = None
+        self.stop = None
+        # move lists reused at every node, one per ply
+        self.move_lists: list[list[int]] = [[] for _ in range(MAX_PLY)]
+
+    def search(
+        self,
+        position: Position,
+        depth: int = MAX_DEPTH,
+        movetime_ms: float | None = None,
+        clock_ms: float | None = None,
+        increment_ms: float = 0,
+        on_iteration: Callable[[SearchResult], None] | None = None,
+        stop=None,
+        first_depth: int = 1,
+    ) -> SearchResult:
+        # stop is an Event-like object: once it's set the search finishes
+        # like it does when its time runs out
+        started = time.perf_counter()
+        budget = time_budget(movetime_ms, clock_ms, increment_ms)
+        deadline = None if budget is None else started + budget / 1000
+        self.nodes = 0
+        self.table.new_search()
+
+        result = SearchResult(None, 0, [], 0, 0, 0.0)
+        history_length = len(position.history)
+        for current_depth in range(first_depth, depth + 1):
+            # depth 1 always runs to completion so there's a move to return
+            self.deadline = deadline if current_depth > 1 else None
+            self.stop = stop if current_depth > 1 else None
+            try:
+                score = self._negamax(position, current_depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                # unwind the moves the aborted iteration was in the middle of
+                while len(position.history) > history_length:
+                    position.unmake_move()
+                break
+            pv = self._principal_variation(position, current_depth)
+            result = SearchResult(
+                pv[0] if pv else None,
+                score,
+                pv,
+                current_depth,
+                self.nodes,
+                time.perf_counter() - started,
+            )
+            if on_iteration is not None:
+                on_iteration(result)
+            if abs(score) > MATE_BOUND or not pv:
+                break  # found a mate, or there's nothing to play
+            if deadline is not None:
+                # the next depth takes a few times longer than everything so
+                # far, don't start it if it obviously can't finish
+                elapsed = time.perf_counter() - started
+                if started + elapsed * 3 > deadline:
+                    break
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - started)
+
+    def close(self) -> None:
+        # nothing to release, ParallelEngine has processes to shut down
+        pass
+
+    def _order(self, position: Position, moves: list[int]) -> None:
+        # captures (most valuable victim, least valuable attacker) and
+        # promotions first, then quiet moves in generation order
+        squares = position.squares
+
+        def priority(move: int) -> int:
+            flags = move >> 12
+            if flags & CAPTURE:
+                victim = PAWN if flags == EN_PASSANT else squares[move >> 6 & 63]
+                return PIECE_VALUES[squares[move & 63]] - 10 * PIECE_VALUES[victim]
+            if flags & PROMOTION:
+                return -PROMOTION_VALUES[flags & 3]
+            return 0
+
+        moves.sort(key=priority)
+
+    def _negamax(
+        self, position: Position, depth: int, alpha: int, beta: int, ply: int
+    ) -> int:
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & CHECK_EVERY:
+            self._check_time()
+
+        key = position.hash
+        hash_move = 0
+        entry = self.table.probe(key)
+        if entry is not None:
+            entry_depth, score, bound, hash_move = entry
+            if ply > 0 and entry_depth >= depth:
+                score = _score_from_table(score, ply)
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and score >= beta:
+                    return score
+                if bound == UPPER and score <= alpha:
+                    return score
+
+        moves = self.move_lists[ply]
+        moves.clear()
+        generate_moves(position, moves=moves)
+        if not moves:
+            # no legal moves: checkmate or stalemate
+            return -MATE + ply if is_in_check(position) else 0
+        self._order(position, moves)
+        if hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = 0
+        for move in moves:
+            position.make(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        self.table.store(
+            key, depth, _score_to_table(best_score, ply), bound, best_move
+        )
+        return best_score
+
+    def _quiesce(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        # only look at captures until the position is quiet, so the static
+        # evaluation isn't taken in the middle of an exchange
+        self.nodes += 1
+        if not self.nodes & CHECK_EVERY:
+            self._check_time()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = self.move_lists[ply]
+        captures.clear()
+        generate_captures(position, moves=captures)
+        self._order(position, captures)
+        for move in captures:
+            position.make(move)
+            score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _check_time(self) -> None:
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout()
+
+    def _principal_variation(
+        self, position: Position, depth: int
+    ) -> list[EngineMove]:
+        # follow hash moves from the root; stop on anything that's no longer
+        # a legal move here (the entry may have been overwritten)
+        pv = []
+        for _ in range(depth):
+            entry = self.table.probe(position.hash)
+            if entry is None or not entry[3]:
+                break
+            move = entry[3]
+            if move not in generate_moves(position):
+                break
+            pv.append(to_engine_move(position, move))
+            position.make(move)
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    # mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: int, ply: int) -> int:
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def _helper(name: str, megabytes: float, replacement: str, tasks, results, stop):
+    # body of a ParallelEngine helper process: search every position handed
+    # over until the main process sets stop, then report back
+    table = SharedTranspositionTable(megabytes, replacement, name)
+    engine = Engine(table)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        snapshot, first_depth, age = task
+        position = pickle.loads(snapshot)
+        # follow the main process's table age, which clear() sets back to 0
+        table.age = age
+        table.probes = table.hits = table.stores = table.collisions = table.used = 0
+        result = engine.search(
+            position, MAX_DEPTH, stop=stop, first_depth=first_depth
+        )
+        counters = (table.probes, table.hits, table.stores, table.collisions)
+        results.put((result, counters + (table.used,)))
+    table.close()
+
+
+class ParallelEngine:
+    """Lazy SMP: the same search run by several processes at once.
+
+    Every process searches the whole tree from the root, and they share
+    one transposition table in shared memory. What one process stores is
+    picked up by the others as hash moves and cutoffs, so together they
+    get through the tree faster than one process can. Half the helpers
+    start one depth ahead so they don't all walk the tree in lockstep.
+
+    The main process runs the search with the requested limits; the
+    helpers keep going until it's done. The deepest completed result wins,
+    and the node counts and table statistics of all processes are merged.
+    Helper processes are started once and reused for every search; call
+    close() when done with the engine.
+    """
+
+    def __init__(
+        self,
+        threads: int,
+        megabytes: float = 16,
+        replacement: str = DEPTH_PREFERRED,
+    ) -> None:
+        self.table = SharedTranspositionTable(megabytes, replacement)
+        self.engine = Engine(self.table)
+        self.nodes = 0
+        context = multiprocessing.get_context()
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.stop = context.Event()
+        self.helpers = [
+            context.Process(
+                target=_helper,
+                args=(
+                    self.table.name,
+                    megabytes,
+                    replacement,
+                    self.tasks,
+                    self.results,
+                    self.stop,
+                ),
+                daemon=True,
+            )
+            for _ in range(threads - 1)
+        ]
+        for helper in self.helpers:
+            helper.start()
+
+    def search(
+        self,
+        position: Position,
+        depth: int = MAX_DEPTH,
+        movetime_ms: float | None = None,
+        clock_ms: float | None = None,
+        increment_ms: float = 0,
+        on_iteration: Callable[[SearchResult], None] | None = None,
+        stop=None,
+    ) -> SearchResult:
+        started = time.perf_counter()
+        # the queue pickles in a background thread, by which time the search
+        # below is already making moves on the position, so take a snapshot
+        snapshot = pickle.dumps(position)
+        for number in range(len(self.helpers)):
+            self.tasks.put((snapshot, 1 + number % 2, self.table.age))
+        result = self.engine.search(
+            position, depth, movetime_ms, clock_ms, increment_ms, on_iteration, stop
+        )
+        self.stop.set()
+
+        nodes = result.nodes
+        table = self.table
+        for _ in self.helpers:
+            helper_result, (probes, hits, stores, collisions, used) = (
+                self.results.get()
+            )
+            nodes += helper_result.nodes
+            table.probes += probes
+            table.hits += hits
+            table.stores += stores
+            table.collisions += collisions
+            table.used += used
+            if helper_result.move is not None and helper_result.depth > result.depth:
+                result = helper_result
+        self.stop.clear()
+        self.nodes = nodes
+        return result._replace(nodes=nodes, seconds=time.perf_counter() - started)
+
+    def close(self) -> None:
+        for _ in self.helpers:
+            self.tasks.put(None)
+        for helper in self.helpers:
+            helper.join()
+        self.table.close()
+
+
+def _background(
+    threads: int, megabytes: float, replacement: str, requests, replies, stop
+):
+    # body of a BackgroundEngine process
+    replies.cancel_join_thread()  # don't hang on exit over an unread report
+    if threads > 1:
+        engine = ParallelEngine(threads, megabytes, replacement)
+    else:
+        engine = Engine(TranspositionTable(megabytes, replacement))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        snapshot, limits = request
+        result = engine.search(
+            pickle.loads(snapshot),
+            *limits,
+            on_iteration=lambda result: replies.put((False, result)),
+            stop=stop,
+        )
+        replies.put((True, result))
+    engine.close()
+
+
+class BackgroundEngine:
+    """An engine running in its own process, for callers that can't block.
+
+    start() hands a position over and returns at once. results() then
+    yields (final, result) pairs: one for every depth the search finishes,
+    and a final one with the move to play. stop() makes the search wrap up
+    early with the best move it has found so far.
+    """
+
+    def __init__(
+        self,
+        threads: int = 1,
+        megabytes: float = 16,
+        replacement: str = DEPTH_PREFERRED,
+    ) -> None:
+        context = multiprocessing.get_context()
+        self.requests = context.Queue()
+        self.replies = context.Queue()
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target=_background,
+            args=(
+                threads,
+                megabytes,
+                replacement,
+                self.requests,
+                self.replies,
+                self.stop_event,
+            ),
+        )
+        self.process.start()
+
+    def start(
+        self,
+        position: Position,
+        depth: int = MAX_DEPTH,
+        movetime_ms: float | None = None,
+        clock_ms: float | None = None,
+        increment_ms: float = 0,
+    ) -> None:
+        self.stop_event.clear()
+        limits = (depth, movetime_ms, clock_ms, increment_ms)
+        self.requests.put((pickle.dumps(position), limits))
+
+    def results(self) -> Iterator[tuple[bool, SearchResult]]:
+        # blocks until the next report, call it off the UI thread
+        while True:
+            final, result = self.replies.get()
+            yield final, result
+            if final:
+                return
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def close(self) -> None:
+        self.stop()
+        self.requests.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def add_engine_arguments(parser) -> None:
+    parser.add_argument(
+        "--depth",
+        type=int,
+        help="engine search depth (default: 3, or unlimited with a time limit)",
+    )
+    parser.add_argument(
+        "--movetime", type=float, metavar="MS", help="engine time per move"
+    )
+    parser.add_argument(
+        "--clock",
+        type=float,
+        metavar="SECONDS",
+        help="engine game clock, spread over the game's moves",
+    )
+    parser.add_argument(
+        "--increment",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="seconds added to the engine's clock after each move",
+    )
+    add_thread_argument(parser)
+    add_hash_arguments(parser)
+
+
+def add_thread_argument(parser) -> None:
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        metavar="N",
+        help="search with N processes sharing the hash table (default: 1)",
+    )
+
+
+def engine_from_args(args) -> Engine | ParallelEngine:
+    if args.threads > 1:
+        return ParallelEngine(args.threads, args.hash, args.hash_replace)
+    return Engine(table_from_args(args))
+
+
+def search_depth(args) -> int:
+    if args.depth is not None:
+        return args.depth
+    if args.movetime is not None or args.clock is not None:
+        return MAX_DEPTH
+    return 3
+
+
+# Fixed benchmark set: each entry is a line of play from the starting
+# position, so the set is reproducible without a position file format.
+BENCH_LINES = [
+    "",
+    "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6",
+    "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7",
+    "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6",
+    "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 d2d3 b7b5 a4b3 d7d6",
+]
+
+
+def position_from_moves(moves: str) -> Position:
+    # play a line of coordinate moves (e2e4 e7e5 ... e7e8q) from the
+    # starting position; a promotion without a letter is to a queen
+    position = Position.from_board(STARTING_BOARD)
+    for move in moves.lower().split():
+        for legal in generate_moves(position):
+            notation = move_to_notation(to_engine_move(position, legal))
+            if notation == move or notation == move + "q":
+                break
+        else:
+            raise ValueError(f"Illegal move: {move}")
+        position.make(legal)
+    return position
+
+
+def bench_positions() -> list[Position]:
+    return [position_from_moves(line) for line in BENCH_LINES]
+
+
+def bench(depth: int, engine: Engine | ParallelEngine) -> tuple[int, float]:
+    nodes = 0
+    seconds = 0.0
+    for number, position in enumerate(bench_positions(), 1):
+        engine.table.clear()
+        result = engine.search(position, depth)
+        nodes += result.nodes
+        seconds += result.seconds
+        pv = " ".join(move_to_notation(move) for move in result.pv)
+        print(
+            f"position {number}: score {result.score} nodes {result.nodes} "
+            f"time {result.seconds:.2f}s pv {pv}"
+        )
+        print(f"  {engine.table.stats()}")
+    print(f"total: {nodes} nodes in {seconds:.2f}s, {nodes / seconds:.0f} nodes/s")
+    return nodes, seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    add_thread_argument(parser)
+    add_hash_arguments(parser)
+    args = parser.parse_args()
+    engine = engine_from_args(args)
+    try:
+        bench(args.depth, engine)
+    finally:
+        engine.close()
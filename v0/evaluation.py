@@ -0,0 +1,146 @@
+# Static evaluation: material plus piece-square tables, with separate
+# middlegame and endgame scores blended by how much material is left.
+#
+# Every term depends on a single (piece, square) pair, so a position's score
+# is a sum over its pieces and a move only has to subtract the terms for the
+# squares it empties and add the ones it fills. Position keeps the running
+# sums (mg, eg, phase) up to date in put_piece, remove_piece and make_move,
+# the same way it keeps its Zobrist hash, which makes evaluate O(1).
+
+from pieces import BLACK_PIECES, EMPTY, WHITE_PIECES
+
+# piece values in centipawns: pawn, knight, bishop, rook, queen, king
+MG_VALUES = (100, 320, 330, 500, 900, 0)
+EG_VALUES = (120, 300, 320, 540, 950, 0)
+
+# game phase: 24 with every piece on the board, 0 with only kings and pawns
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+# Square tables from white's point of view, laid out like a Board: the first
+# row is rank 8. Black uses the same tables flipped vertically.
+# fmt: off
+_PAWN_MG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+_PAWN_EG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     20,  20,  20,  20,  20,  20,  20,  20,
+     10,  10,  10,  10,  10,  10,  10,  10,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+_KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+_QUEEN = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+_KING_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+_KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+# fmt: on
+
+_MG_SQUARES = (_PAWN_MG, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_MG)
+_EG_SQUARES = (_PAWN_EG, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_EG)
+
+
+def _piece_tables(values, squares) -> list[list[int]]:
+    # per piece code and square, the piece's value plus its square bonus,
+    # signed so that white pieces count up and black pieces count down
+    tables = [[0] * 64 for _ in range(16)]
+    for kind in range(6):
+        value = values[kind]
+        table = squares[kind]
+        tables[WHITE_PIECES[kind]] = [value + table[sq] for sq in range(64)]
+        # flip the rank (sq ^ 56) so black reads the table from its own side
+        tables[BLACK_PIECES[kind]] = [-(value + table[sq ^ 56]) for sq in range(64)]
+    return tables
+
+
+MG_TABLES = _piece_tables(MG_VALUES, _MG_SQUARES)
+EG_TABLES = _piece_tables(EG_VALUES, _EG_SQUARES)
+PHASES = [0] * 16
+for _kind, _weight in enumerate(PHASE_WEIGHTS):
+    PHASES[WHITE_PIECES[_kind]] = PHASES[BLACK_PIECES[_kind]] = _weight
+
+
+def compute_scores(position) -> tuple[int, int, int]:
+    # full O(64) computation of (mg, eg, phase), used to verify the values
+    # Position maintains incrementally
+    mg = eg = phase = 0
+    for square, piece in enumerate(position.squares):
+        if piece != EMPTY:
+            mg += MG_TABLES[piece][square]
+            eg += EG_TABLES[piece][square]
+            phase += PHASES[piece]
+    return mg, eg, phase
+
+
+def evaluate(position) -> int:
+    """Tapered evaluation in centipawns from the side to move's point of view."""
+    # promotions can push the phase past its starting value
+    phase = min(position.phase, MAX_PHASE)
+    score = (position.mg * phase + position.eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if position.white_to_move else -score
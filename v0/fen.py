@@ -0,0 +1,319 @@
+import argparse
+import mmap
+import random
+import struct
+import time
+from typing import Iterator
+
+from attacks import KING_ATTACKS
+from bitboard import (
+    BLACK_KINGSIDE,
+    BLACK_QUEENSIDE,
+    NO_SQUARE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    Position,
+)
+from evaluation import EG_TABLES, MG_TABLES, PHASES
+from movegen import generate_moves
+from pieces import (
+    BLACK,
+    BLACK_KING,
+    BLACK_PAWN,
+    EMPTY,
+    PIECES,
+    WHITE_KING,
+    WHITE_PAWN,
+)
+from zobrist import BLACK_TO_MOVE_KEY, CASTLING_KEYS, EP_FILE_KEYS, PIECE_KEYS
+
+# Forsyth-Edwards Notation: piece placement from rank 8 down (white pieces
+# in uppercase, digits for runs of empty squares), side to move, castling
+# rights, en passant square, halfmove clock and fullmove number:
+#
+#   rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1
+#
+# Parsing is built for loading positions in bulk. The same few rank strings
+# turn up over and over (8, pppppppp, PPPPPPPP, RNBQKBNR, ...), so every
+# rank is parsed once into everything the Position needs from it (mailbox
+# row, bitboards, hash, evaluation sums) and looked up after that; a FEN
+# made of known ranks costs eight dictionary lookups plus the last fields.
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+_LETTERS = dict(zip("PNBRQKpnbrqk", PIECES))
+_PIECE_LETTERS = [""] * 16
+for _letter, _piece in _LETTERS.items():
+    _PIECE_LETTERS[_piece] = _letter
+
+_CASTLING_LETTERS = (
+    (WHITE_KINGSIDE, "K"),
+    (WHITE_QUEENSIDE, "Q"),
+    (BLACK_KINGSIDE, "k"),
+    (BLACK_QUEENSIDE, "q"),
+)
+# rights mask to FEN field and back, for every mask
+CASTLING_FIELDS = [
+    "".join(letter for right, letter in _CASTLING_LETTERS if mask & right) or "-"
+    for mask in range(16)
+]
+_CASTLING_MASKS = {field: mask for mask, field in enumerate(CASTLING_FIELDS)}
+
+# en passant field to (square, hash key)
+_EP_SQUARES = {"-": (NO_SQUARE, 0)}
+for _col, _file in enumerate("abcdefgh"):
+    for _rank in "36":
+        _EP_SQUARES[_file + _rank] = (
+            (8 - int(_rank)) * 8 + _col,
+            EP_FILE_KEYS[_col],
+        )
+
+# A parsed rank is (mailbox row, bits, hash, sums). bits packs the rank's
+# share of every bitboard into one integer, 64 bits per lane: lanes 0-15 are
+# the piece bitboards by code, 16 white and 17 black. sums packs mg, eg and
+# phase in 32 bit lanes, mg and eg offset by _BIAS to keep them positive.
+# Combining eight ranks is then a handful of big-int operations, and the
+# bitboards come back out with a single struct.unpack.
+_WHITE_LANE = 16
+_BLACK_LANE = 17
+_LANES = struct.Struct("<18Q")
+_BIAS = 1 << 24
+_MASK_32 = (1 << 32) - 1
+
+# parsed ranks by text, one table per row; a table is cleared when it grows
+# past _RANK_CACHE_SIZE
+_RANKS: list[dict[str, tuple]] = [{} for _ in range(8)]
+_RANK_CACHE_SIZE = 1 << 14
+
+
+def _parse_rank(row: int, text: str) -> tuple:
+    squares = []
+    for char in text:
+        if char in "12345678":
+            squares += [EMPTY] * int(char)
+        elif char in _LETTERS:
+            squares.append(_LETTERS[char])
+        else:
+            raise ValueError(f"Invalid FEN rank: {text}")
+    if len(squares) != 8:
+        raise ValueError(f"Invalid FEN rank: {text}")
+    if row in (0, 7) and (WHITE_PAWN in squares or BLACK_PAWN in squares):
+        raise ValueError(f"Invalid FEN rank, a pawn on the back rank: {text}")
+
+    bits = key = mg = eg = phase = 0
+    for col, piece in enumerate(squares):
+        if piece == EMPTY:
+            continue
+        square = row * 8 + col
+        side = _BLACK_LANE if piece & BLACK else _WHITE_LANE
+        bits |= 1 << (piece * 64 + square) | 1 << (side * 64 + square)
+        key ^= PIECE_KEYS[piece][square]
+        mg += MG_TABLES[piece][square]
+        eg += EG_TABLES[piece][square]
+        phase += PHASES[piece]
+    sums = (mg + _BIAS) | (eg + _BIAS) << 32 | phase << 64
+    rank = (tuple(squares), bits, key, sums)
+    table = _RANKS[row]
+    if len(table) >= _RANK_CACHE_SIZE:
+        table.clear()
+    table[text] = rank
+    return rank
+
+
+def position_from_fen(fen: str) -> Position:
+    """Build a Position from a FEN string.
+
+    The move counters may be left off, as in EPD records; they then default
+    to 0 and 1. Castling rights of a king or rook that has left its home
+    square are dropped. Raises ValueError for anything else that isn't a
+    valid FEN, such as an en passant square without the pawn that made it,
+    a pawn on the first or last rank, or not exactly one king a side.
+    """
+    fields = fen.split()
+    if len(fields) == 6:
+        placement, side, castling, ep, halfmove, fullmove = fields
+    elif len(fields) == 4:
+        placement, side, castling, ep = fields
+        halfmove, fullmove = "0", "1"
+    else:
+        raise ValueError(f"Invalid FEN: {fen}")
+    rows = placement.split("/")
+    if len(rows) != 8:
+        raise ValueError(f"Invalid FEN: {fen}")
+    ranks = list(map(dict.get, _RANKS, rows))
+    if None in ranks:
+        ranks = [rank or _parse_rank(row, rows[row]) for row, rank in enumerate(ranks)]
+    r0, r1, r2, r3, r4, r5, r6, r7 = ranks
+
+    if side == "w":
+        white_to_move = True
+        key = 0
+    elif side == "b":
+        white_to_move = False
+        key = BLACK_TO_MOVE_KEY
+    else:
+        raise ValueError(f"Invalid FEN side to move: {side}")
+    rights = _CASTLING_MASKS.get(castling)
+    if rights is None:
+        # the same letters in another order, such as kqKQ
+        rights = 0
+        for right, letter in _CASTLING_LETTERS:
+            if letter in castling:
+                rights |= right
+        if sorted(castling) != sorted(CASTLING_FIELDS[rights]):
+            raise ValueError(f"Invalid FEN castling rights: {castling}")
+    if ep not in _EP_SQUARES:
+        raise ValueError(f"Invalid FEN en passant square: {ep}")
+    ep_square, ep_key = _EP_SQUARES[ep]
+
+    position = Position()
+    try:
+        position.halfmove_clock = int(halfmove)
+        position.fullmove_number = int(fullmove)
+    except ValueError:
+        raise ValueError(f"Invalid FEN move counters: {halfmove} {fullmove}")
+    squares = [*r0[0], *r1[0], *r2[0], *r3[0], *r4[0], *r5[0], *r6[0], *r7[0]]
+    position.squares = squares
+    if rights:
+        # like Position.from_board, drop the rights of a king or rook that
+        # isn't on its home square
+        rights &= position.castling_from_placement()
+    if ep_square != NO_SQUARE:
+        # the square behind a pawn of the side not to move that has just
+        # made a double push, from an empty square to an empty one
+        if white_to_move:
+            expected, pawn, origin = 2, ep_square + 8, ep_square - 8
+        else:
+            expected, pawn, origin = 5, ep_square - 8, ep_square + 8
+        if (
+            ep_square >> 3 != expected
+            or squares[pawn] != (BLACK_PAWN if white_to_move else WHITE_PAWN)
+            or squares[ep_square] != EMPTY
+            or squares[origin] != EMPTY
+        ):
+            raise ValueError(f"Invalid FEN en passant square: {ep}")
+    bits = r0[1] | r1[1] | r2[1] | r3[1] | r4[1] | r5[1] | r6[1] | r7[1]
+    lanes = _LANES.unpack(bits.to_bytes(_LANES.size, "little"))
+    position.bitboards = list(lanes[:16])
+    # one king a side, not next to each other
+    white_king, black_king = lanes[WHITE_KING], lanes[BLACK_KING]
+    if (
+        white_king & (white_king - 1)
+        or black_king & (black_king - 1)
+        or not white_king
+        or not black_king
+        or KING_ATTACKS[white_king.bit_length() - 1] & black_king
+    ):
+        raise ValueError(f"Invalid FEN kings: {placement}")
+    position.white = white = lanes[_WHITE_LANE]
+    position.black = black = lanes[_BLACK_LANE]
+    position.occupied = white | black
+    sums = r0[3] + r1[3] + r2[3] + r3[3] + r4[3] + r5[3] + r6[3] + r7[3]
+    position.mg = (sums & _MASK_32) - 8 * _BIAS
+    position.eg = (sums >> 32 & _MASK_32) - 8 * _BIAS
+    position.phase = sums >> 64
+    position.white_to_move = white_to_move
+    position.castling = rights
+    position.ep_square = ep_square
+    position.hash = (
+        key
+        ^ CASTLING_KEYS[rights]
+        ^ ep_key
+        ^ r0[2] ^ r1[2] ^ r2[2] ^ r3[2] ^ r4[2] ^ r5[2] ^ r6[2] ^ r7[2]
+    )
+    return position
+
+
+def position_to_fen(position: Position) -> str:
+    squares = position.squares
+    rows = []
+    for row in range(0, 64, 8):
+        text = ""
+        empty = 0
+        for piece in squares[row : row + 8]:
+            if piece == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += _PIECE_LETTERS[piece]
+        rows.append(text + str(empty) if empty else text)
+    if position.ep_square == NO_SQUARE:
+        ep = "-"
+    else:
+        row, col = divmod(position.ep_square, 8)
+        ep = "abcdefgh"[col] + str(8 - row)
+    return (
+        f"{'/'.join(rows)} {'w' if position.white_to_move else 'b'} "
+        f"{CASTLING_FIELDS[position.castling]} {ep} "
+        f"{position.halfmove_clock} {position.fullmove_number}"
+    )
+
+
+def read_fens(
+    path: str, start: int = 0, end: int | None = None
+) -> Iterator[tuple[int, str]]:
+    """Yield (offset, line) for every non-empty line of a file of FENs.
+
+    Like pgn.read_games, the file is memory mapped, and with start and end
+    only the lines starting from the first line boundary at or after each of
+    them are read.
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty file
+        with data:
+            if start:
+                start = data.find(b"\n", start - 1) + 1 or len(data)
+            if end is None:
+                stop = len(data)
+            else:
+                stop = data.find(b"\n", end - 1) + 1 or len(data)
+            data.seek(start)
+            offset = start
+            while offset < stop:
+                line = data.readline()
+                if line.strip():
+                    yield offset, line.strip().decode(errors="replace")
+                offset += len(line)
+
+
+def sample_fens(count: int, seed: int = 0) -> list[str]:
+    # FENs of the positions along random games, a stand-in for a real corpus
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        position = position_from_fen(STARTING_FEN)
+        for _ in range(100):
+            moves = generate_moves(position)
+            if not moves or len(fens) == count:
+                break
+            position.make(rng.choice(moves))
+            fens.append(position_to_fen(position))
+    return fens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FEN parsing benchmark")
+    parser.add_argument(
+        "file", nargs="?", help="one FEN per line (default: random game positions)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="parse the whole set this many times"
+    )
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            fens = [line.strip() for line in f if line.strip()]
+    else:
+        fens = sample_fens(100_000)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for fen in fens:
+            position_from_fen(fen)
+    seconds = time.perf_counter() - started
+    count = len(fens) * args.repeat
+    print(f"{count} positions in {seconds:.2f}s, {count / seconds:.0f} FENs/s")
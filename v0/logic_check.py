@@ -1,165 +1,219 @@
-from type_defs import Board, BoardLoc, Move, MoveType
-from utils import (
-    is_bishop,
-    is_black_piece,
-    is_knight,
-    is_pawn,
-    is_queen,
-    is_rook,
-    is_white_piece,
+from collections import OrderedDict
+
+from attacks import (
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    LINE,
+    PAWN_ATTACKS,
+    attack_map,
+    bishop_attacks,
+    queen_attacks,
+    rook_attacks,
 )
+from bitboard import NO_SQUARE, RANK_2, RANK_7, Position, iter_squares, north, south
+from movegen import castling_moves, legal_targets, pins_and_evasions
+from moves import move_end
+from pieces import EMPTY, GLYPHS, IS_BLACK, IS_WHITE, PIECE_TYPES, TYPE_NAMES
+from type_defs import Board, BoardLoc, Move, MoveType
 
 
-def is_valid_pawn_move(
-    board: Board, start: BoardLoc, end: BoardLoc, pawn_is_white: bool
-) -> bool:
-    target = board[end[0]][end[1]]
-
-    # determine the direction of movement
-    direction = -1 if pawn_is_white else 1
-
-    # normal forward move (no capture allowed)
-    if start[1] == end[1]:  # we are moving along the same column / file
-        # 1 square move
-        if end[0] == start[0] + direction:
-            return target == "."  # must move to an empty square
-
-        # first move of a pawn can be 2 squares
-        # white pawns start at rank 2 (8 total ranks - 6th index)
-        # Black pawns start at rank 7 (8 total ranks - 1st index)
-        if (pawn_is_white and start[0] == 6) or (not pawn_is_white and start[0] == 1):
-            if end[0] == start[0] + 2 * direction:
-                middle_square = board[start[0] + direction][start[1]]
-                return (
-                    target == "." and middle_square == "."
-                )  # both squares must be empty
-
-    # diagonal capture of opponent piece
-    # we check that the end row (rank) is 1 ahead of the start row (rank)
-    # and
-    # that the end column (file) is 1 less or 1 greater than the start column (file)
-    # For example with this board:
-    # 8 | ♜ ♞ ♝ ♛ ♚ ♝ ♞ ♜
-    # 7 | ♟ ♟ ♟ . ♟ ♟ ♟ ♟
-    # 6 | . . . . . . . .
-    # 5 | . . . ♟ . . . .
-    # 4 | . . . . ♙ . . .
-    # 3 | . . . . . . . .
-    # 2 | ♙ ♙ ♙ ♙ . ♙ ♙ ♙
-    # 1 | ♖ ♘ ♗ ♕ ♔ ♗ ♘ ♖
-    #     a b c d e f g h
-    #
-    # if it was white's turn and they entered e4d5,
-    # direction = -1
-    # which converts to the piece move operation (4, 4) -> (3, 3)
-    # we can see that the end[0] (3) == start[0] + (-1) (4 - 1 = 3)
-    # we can also confirm that end[1] - start[1] |3 - 4| = 1
-    # the same proof holds if the black piece was on f5
-    if end[0] == start[0] + direction and abs(end[1] - start[1]) == 1:
-        if pawn_is_white:
-            return is_black_piece(target)
-        return is_white_piece(target)
-
-    return False
+# list boards converted lately, by their contents; cleared when it grows
+# past _CONVERTED_SIZE
+_CONVERTED: dict[tuple, Position] = {}
+_CONVERTED_SIZE = 64
 
 
-def is_valid_knight_move(
-    board: Board, start: BoardLoc, end: BoardLoc, knight_is_white: bool
-) -> bool:
-    # get the differences in rank and file
-    rank_diff = abs(end[0] - start[0])
-    file_diff = abs(end[1] - start[1])
+def as_position(board: Board | Position) -> Position:
+    """The Position every query runs on.
 
-    # check if it's an L-shape move (2 up + 1 left | right OR 1 up + 2 left | right)
-    if not ((rank_diff == 2 and file_diff == 1) or (rank_diff == 1 and file_diff == 2)):
-        return False
+    A list Board is converted on the way in, which costs about as much as
+    twenty queries (bitboards, Zobrist hash and evaluation sums are all set
+    up). The conversion is kept, so asking about the same board square
+    after square only converts it once; callers that hold on to a board
+    should still convert it themselves and pass the Position. Positions
+    converted here are shared between calls and must not be modified.
+    """
+    if isinstance(board, Position):
+        return board
+    key = tuple(map(tuple, board))
+    position = _CONVERTED.get(key)
+    if position is None:
+        if len(_CONVERTED) >= _CONVERTED_SIZE:
+            _CONVERTED.clear()
+        position = _CONVERTED[key] = Position.from_board(board)
+    return position
 
-    # check if target square has a friendly piece
-    target = board[end[0]][end[1]]
-    if knight_is_white:
-        return not is_white_piece(target)  # can't capture own piece
 
-    return not is_black_piece(target)  # can't capture own piece
+def _square(loc: BoardLoc) -> int:
+    return loc[0] * 8 + loc[1]
 
 
-def is_valid_bishop_move(
-    board: Board, start: BoardLoc, end: BoardLoc, bishop_is_white: bool
-) -> bool:
-    # get the differences in rank(row) and file(column)
-    rank_diff = end[0] - start[0]
-    file_diff = end[1] - start[1]
+_LOCS = [divmod(square, 8) for square in range(64)]
 
-    # check if move is diagonal (absolute differences should be equal)
-    if abs(rank_diff) != abs(file_diff):
-        return False
 
-    # determine direction of movement
-    rank_step = 1 if rank_diff > 0 else -1
-    file_step = 1 if file_diff > 0 else -1
+def _to_moves(targets: int, enemies: int) -> list[Move]:
+    # turn a target bitboard into (location, move type) pairs
+    captures = targets & enemies
+    advances = targets ^ captures
+    moves = [(_LOCS[square], MoveType.ADVANCE) for square in iter_squares(advances)]
+    moves += [(_LOCS[square], MoveType.CAPTURE) for square in iter_squares(captures)]
+    return moves
 
-    # check path for blocking pieces
-    current_rank = start[0] + rank_step
-    current_file = start[1] + file_step
 
-    # check all diagonal squares between start and end (exclusive)
-    while (current_rank, current_file) != end:
-        if board[current_rank][current_file] != ".":
-            return False  # path is blocked
-        current_rank += rank_step
-        current_file += file_step
+def _legal(position: Position, square: int, is_white: bool, targets: int) -> int:
+    # drop the targets that would leave the own king in check: a pinned
+    # piece has to stay on its pin line, and in check only moves that
+    # capture or block the checker are allowed. Pins and checks are looked
+    # for once per position, every piece after that is two masks
+    pinned, evasions, king = pins_and_evasions(position, is_white)
+    if pinned >> square & 1:
+        targets &= LINE[king][square]
+    return targets & evasions
+
+
+def _pawn_pushes(position: Position, bit: int, is_white: bool) -> tuple[int, int]:
+    # returns the (single push, double push) target bitboards for one pawn
+    empty = ~position.occupied
+    if is_white:
+        single = north(bit) & empty
+        double = north(single & (RANK_2 >> 8)) & empty
+    else:
+        single = south(bit) & empty
+        double = south(single & (RANK_7 << 8)) & empty
+    return single, double
+
+
+def _pawn_targets(position: Position, square: int, is_white: bool) -> int:
+    bit = 1 << square
+    single, double = _pawn_pushes(position, bit, is_white)
+    attacks = PAWN_ATTACKS[is_white][square]
+    captures = attacks & position.enemy(is_white)
+    targets = _legal(position, square, is_white, single | double | captures)
+    ep_square = position.ep_square
+    # the en passant square only belongs to pawns of the side to move. The
+    # capture empties two squares of the rank, which the masks don't cover,
+    # so movegen plays it to see whether it uncovers the king
+    if (
+        ep_square != NO_SQUARE
+        and is_white == position.white_to_move
+        and attacks >> ep_square & 1
+    ):
+        targets |= legal_targets(position, square, is_white) & 1 << ep_square
+    return targets
 
-    # check destination square
-    target = board[end[0]][end[1]]
-    if bishop_is_white:
-        return not is_white_piece(target)  # can't capture own piece
-    return not is_black_piece(target)  # can't capture own piece
 
+def _knight_targets(position: Position, square: int, is_white: bool) -> int:
+    targets = KNIGHT_ATTACKS[square] & ~position.friendly(is_white)
+    return _legal(position, square, is_white, targets)
 
-def is_valid_rook_move(
-    board: Board, start: BoardLoc, end: BoardLoc, rook_is_white: bool
+
+def _king_targets(position: Position, square: int, is_white: bool) -> int:
+    # the king may not step onto a square the other side attacks
+    safe = ~position.friendly(is_white) & ~attack_map(position, not is_white)
+    targets = KING_ATTACKS[square] & safe
+    castles = []
+    castling_moves(position, square, is_white, castles)
+    for move in castles:
+        targets |= 1 << move_end(move)
+    return targets
+
+
+def _bishop_targets(position: Position, square: int, is_white: bool) -> int:
+    attacks = bishop_attacks(square, position.occupied)
+    return _legal(position, square, is_white, attacks & ~position.friendly(is_white))
+
+
+def _rook_targets(position: Position, square: int, is_white: bool) -> int:
+    attacks = rook_attacks(square, position.occupied)
+    return _legal(position, square, is_white, attacks & ~position.friendly(is_white))
+
+
+def _queen_targets(position: Position, square: int, is_white: bool) -> int:
+    attacks = queen_attacks(square, position.occupied)
+    return _legal(position, square, is_white, attacks & ~position.friendly(is_white))
+
+
+# indexed by piece type, see pieces.py
+_TARGETS = (
+    None,
+    _pawn_targets,
+    _knight_targets,
+    _bishop_targets,
+    _rook_targets,
+    _queen_targets,
+    _king_targets,
+)
+
+
+def get_targets(position: Position, square: int) -> int:
+    # bitboard of every square the piece on square can move to
+    piece = position.squares[square]
+    if piece == EMPTY:
+        return 0
+    return _TARGETS[PIECE_TYPES[piece]](position, square, IS_WHITE[piece])
+
+
+def is_valid_pawn_move(
+    board: Board | Position, start: BoardLoc, end: BoardLoc, pawn_is_white: bool
 ) -> bool:
-    # get the difference in rank and file
-    rank_diff = end[0] - start[0]
-    file_diff = end[1] - start[1]
+    # forward pushes only land on empty squares (a double push also needs
+    # the square in between to be empty) and diagonal steps must capture,
+    # either a piece on the square or en passant
+    position = as_position(board)
+    targets = _pawn_targets(position, _square(start), pawn_is_white)
+    return bool((targets >> _square(end)) & 1)
 
-    # check if move is horizontal (same row) or vertical (same column)
-    if rank_diff != 0 and file_diff != 0:  # one of them must be 0
-        return False
 
-    # determine the direction of movement
-    rank_step = 0 if rank_diff == 0 else (1 if rank_diff > 0 else -1)
-    file_step = 0 if file_diff == 0 else (1 if file_diff > 0 else -1)
+def is_valid_knight_move(
+    board: Board | Position, start: BoardLoc, end: BoardLoc, knight_is_white: bool
+) -> bool:
+    # an L-shape move (2 up + 1 left | right OR 1 up + 2 left | right)
+    # onto a square without a friendly piece
+    position = as_position(board)
+    targets = _knight_targets(position, _square(start), knight_is_white)
+    return bool((targets >> _square(end)) & 1)
 
-    # check path for blocking pieces
-    current_rank = start[0] + rank_step
-    current_file = start[1] + file_step
 
-    # check all squares between start and end (exclusive)
-    while (current_rank, current_file) != end:
-        if board[current_rank][current_file] != ".":
-            return False  # path is blocked
-        current_rank += rank_step
-        current_file += file_step
+def is_valid_bishop_move(
+    board: Board | Position, start: BoardLoc, end: BoardLoc, bishop_is_white: bool
+) -> bool:
+    # diagonal rays stop at the first piece, which is only a valid target
+    # if it belongs to the opponent
+    position = as_position(board)
+    targets = _bishop_targets(position, _square(start), bishop_is_white)
+    return bool((targets >> _square(end)) & 1)
 
-    # check destination square
-    target = board[end[0]][end[1]]
-    if rook_is_white:
-        return not is_white_piece(target)  # can't capture own piece
-    return not is_black_piece(target)  # can't capture own piece
+
+def is_valid_rook_move(
+    board: Board | Position, start: BoardLoc, end: BoardLoc, rook_is_white: bool
+) -> bool:
+    # same as the bishop, but along ranks and files
+    position = as_position(board)
+    targets = _rook_targets(position, _square(start), rook_is_white)
+    return bool((targets >> _square(end)) & 1)
 
 
 def is_valid_queen_move(
-    board: Board, start: BoardLoc, end: BoardLoc, queen_is_white: bool
+    board: Board | Position, start: BoardLoc, end: BoardLoc, queen_is_white: bool
+) -> bool:
+    # a queen moves like a rook and a bishop combined
+    position = as_position(board)
+    targets = _queen_targets(position, _square(start), queen_is_white)
+    return bool((targets >> _square(end)) & 1)
+
+
+def is_valid_king_move(
+    board: Board | Position, start: BoardLoc, end: BoardLoc, king_is_white: bool
 ) -> bool:
-    # conveniently, a queen move is valid if it's either a valid rook move
-    # OR a valid bishop moves
-    return is_valid_rook_move(
-        board, start, end, queen_is_white
-    ) or is_valid_bishop_move(board, start, end, queen_is_white)
+    # one step in any direction onto a square without a friendly piece
+    # that isn't attacked, or two squares sideways to castle
+    position = as_position(board)
+    targets = _king_targets(position, _square(start), king_is_white)
+    return bool((targets >> _square(end)) & 1)
 
 
 def is_valid_move(
-    board: Board, start: BoardLoc, end: BoardLoc, is_white_turn: bool
+    board: Board | Position, start: BoardLoc, end: BoardLoc, is_white_turn: bool
 ) -> bool:
     # Basic checks to make sure the end and start coordinates are
     # actually within the bounds of the board
@@ -171,205 +225,156 @@ def is_valid_move(
     ):
         return False  # Out of Bounds
 
-    piece = board[start[0]][start[1]]
+    position = as_position(board)
+    piece = position.piece_at(start)
 
     # Can't move an empty square
-    if piece == ".":
+    if piece == EMPTY:
         return False
 
     # Check if moving the correct color
-    if is_white_turn and not is_white_piece(piece):
-        raise ValueError(f"White's turn but trying to move {piece}")
-    if not is_white_turn and not is_black_piece(piece):
-        raise ValueError(f"Black's turn but trying to move {piece}")
-
-    if is_pawn(piece):
-        if not is_valid_pawn_move(board, start, end, is_white_turn):
-            raise ValueError("Invalid pawn move")
-    elif is_knight(piece):
-        if not is_valid_knight_move(board, start, end, is_white_turn):
-            raise ValueError("Invalid knight move")
-    elif is_bishop(piece):
-        if not is_valid_bishop_move(board, start, end, is_white_turn):
-            raise ValueError("Invalid bishop move")
-    elif is_rook(piece):
-        if not is_valid_rook_move(board, start, end, is_white_turn):
-            raise ValueError("Invalid rook move")
-    elif is_queen(piece):
-        if not is_valid_queen_move(board, start, end, is_white_turn):
-            raise ValueError("Invalid queen move")
-
-    return True
-
-
-def get_pawn_moves(board: Board, start: BoardLoc) -> list[Move]:
-    moves = []
-    piece = board[start[0]][start[1]]
-    is_white = is_white_piece(piece)
-    direction = -1 if is_white else 1
-
-    # Forward moves
-    forward = (start[0] + direction, start[1])
-    if 0 <= forward[0] <= 7:
-        if board[forward[0]][forward[1]] == ".":
-            moves.append((forward, MoveType.ADVANCE))
-            # First move can be two squares
-            if (is_white and start[0] == 6) or (not is_white and start[0] == 1):
-                two_forward = (start[0] + 2 * direction, start[1])
-                if board[two_forward[0]][two_forward[1]] == ".":
-                    moves.append((two_forward, MoveType.DOUBLE_ADVANCE))
-
-    # Diagonal captures
-    for file_offset in [-1, 1]:
-        new_file = start[1] + file_offset
-        if 0 <= new_file <= 7:
-            capture = (start[0] + direction, new_file)
-            if 0 <= capture[0] <= 7:
-                target = board[capture[0]][capture[1]]
-                if (is_white and is_black_piece(target)) or (
-                    not is_white and is_white_piece(target)
-                ):
-                    moves.append((capture, MoveType.CAPTURE))
-
-    return moves
-
+    if is_white_turn and not IS_WHITE[piece]:
+        raise ValueError(f"White's turn but trying to move {GLYPHS[piece]}")
+    if not is_white_turn and not IS_BLACK[piece]:
+        raise ValueError(f"Black's turn but trying to move {GLYPHS[piece]}")
 
-def get_knight_moves(board: Board, start: BoardLoc) -> list[Move]:
-    moves = []
-    piece = board[start[0]][start[1]]
-    is_white = is_white_piece(piece)
-
-    # offsets to compute all possible knight moves
-    offsets = [
-        (-2, -1),
-        (-2, 1),  # Up 2, left/right 1
-        (2, -1),
-        (2, 1),  # Down 2, left/right 1
-        (-1, -2),
-        (-1, 2),  # Up 1, left/right 2
-        (1, -2),
-        (1, 2),  # Down 1, left/right 2
-    ]
+    kind = PIECE_TYPES[piece]
+    targets = _TARGETS[kind](position, _square(start), is_white_turn)
+    if not (targets >> _square(end)) & 1:
+        raise ValueError(f"Invalid {TYPE_NAMES[kind]} move")
 
-    for rank_offset, file_offset in offsets:
-        new_rank = start[0] + rank_offset
-        new_file = start[1] + file_offset
-
-        # check if the move is within board bounds
-        if 0 <= new_rank <= 7 and 0 <= new_file <= 7:
-            end = (new_rank, new_file)
-            target = board[new_rank][new_file]
+    return True
 
-            # determine if it's a capture or a regular move
-            if target == ".":
-                moves.append((end, MoveType.ADVANCE))
-            elif (is_white and is_black_piece(target)) or (
-                not is_white and is_white_piece(target)
-            ):
-                moves.append((end, MoveType.CAPTURE))
 
-    return moves
+def get_pawn_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    bit = 1 << square
+    is_white = bool((position.white >> square) & 1)
 
+    targets = _pawn_targets(position, square, is_white)
 
-def get_bishop_moves(board: Board, start: BoardLoc) -> list[Move]:
     moves = []
-    piece = board[start[0]][start[1]]
-    is_white = is_white_piece(piece)
-
-    # check all 4 diagonal directions
-    directions = [
-        (-1, -1),  # North West
-        (-1, 1),  # North East
-        (1, -1),  # South West
-        (1, 1),  # South East
-    ]
+    # Forward moves, the first move can be two squares
+    single, double = _pawn_pushes(position, bit, is_white)
+    single &= targets
+    double &= targets
+    if single:
+        moves.append((_LOCS[single.bit_length() - 1], MoveType.ADVANCE))
+    if double:
+        moves.append((_LOCS[double.bit_length() - 1], MoveType.DOUBLE_ADVANCE))
 
-    # for each direction, compute all possible squares we can
-    # move to
-    for rank_step, file_step in directions:
-        current_rank = start[0] + rank_step
-        current_file = start[1] + file_step
-
-        # keep moving in this direction until we hit a piece or the board edge
-        while 0 <= current_rank <= 7 and 0 <= current_file <= 7:
-            target = board[current_rank][current_file]
-            end = (current_rank, current_file)
-
-            if target == ".":
-                moves.append((end, MoveType.ADVANCE))
-            elif (is_white and is_black_piece(target)) or (
-                not is_white and is_white_piece(target)
-            ):
-                moves.append((end, MoveType.CAPTURE))
-                break  # stop after a capture
-            else:
-                break  # stop at friendly piece
-
-            current_rank += rank_step
-            current_file += file_step
+    # Diagonal captures
+    captures = PAWN_ATTACKS[is_white][square] & targets
+    for capture in iter_squares(captures):
+        if capture == position.ep_square:
+            moves.append((_LOCS[capture], MoveType.EN_PASSANT))
+        else:
+            moves.append((_LOCS[capture], MoveType.CAPTURE))
 
     return moves
 
 
-def get_rook_moves(board: Board, start: BoardLoc) -> list[Move]:
-    moves = []
-    piece = board[start[0]][start[1]]
-    is_white = is_white_piece(piece)
-
-    # check all 4 directions
-    directions = [
-        (-1, 0),  # North
-        (1, 0),  # South
-        (0, -1),  # West
-        (0, 1),  # East
+def get_knight_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    is_white = bool((position.white >> square) & 1)
+    targets = _knight_targets(position, square, is_white)
+    return _to_moves(targets, position.enemy(is_white))
+
+
+def get_bishop_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    is_white = bool((position.white >> square) & 1)
+    targets = _bishop_targets(position, square, is_white)
+    return _to_moves(targets, position.enemy(is_white))
+
+
+def get_rook_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    is_white = bool((position.white >> square) & 1)
+    targets = _rook_targets(position, square, is_white)
+    return _to_moves(targets, position.enemy(is_white))
+
+
+def get_queen_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    is_white = bool((position.white >> square) & 1)
+    targets = _queen_targets(position, square, is_white)
+    return _to_moves(targets, position.enemy(is_white))
+
+
+def get_king_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    square = _square(start)
+    is_white = bool((position.white >> square) & 1)
+    targets = _king_targets(position, square, is_white)
+    moves = _to_moves(targets, position.enemy(is_white))
+    # a king moving two squares is castling
+    return [
+        (end, MoveType.CASTLE) if abs(end[1] - start[1]) == 2 else (end, move_type)
+        for end, move_type in moves
     ]
 
-    for rank_step, file_step in directions:
-        current_rank = start[0] + rank_step
-        current_file = start[1] + file_step
 
-        # keep moving in this direction until we hit a piece or the board's edge
-        while 0 <= current_rank <= 7 and 0 <= current_file <= 7:
-            target = board[current_rank][current_file]
-            end = (current_rank, current_file)
-
-            if target == ".":
-                moves.append((end, MoveType.ADVANCE))
-            elif (is_white and is_black_piece(target)) or (
-                not is_white and is_white_piece(target)
-            ):
-                moves.append((end, MoveType.CAPTURE))
-                break  # stop after capture
-            else:
-                break  # stop at friendly piece
-
-            current_rank += rank_step
-            current_file += file_step
-
-    return moves
-
-
-def get_queen_moves(board: Board, start: BoardLoc) -> list[Move]:
-    # combine rook and bishop moves
-    rook_moves = get_rook_moves(board, start)
-    bishop_moves = get_bishop_moves(board, start)
-    return rook_moves + bishop_moves
+# indexed by piece type, see pieces.py
+_MOVES = (
+    None,
+    get_pawn_moves,
+    get_knight_moves,
+    get_bishop_moves,
+    get_rook_moves,
+    get_queen_moves,
+    get_king_moves,
+)
 
 
-def get_possible_moves(board: Board, start: BoardLoc) -> list[Move]:
-    piece = board[start[0]][start[1]]
-    if piece == ".":
+def get_possible_moves(board: Board | Position, start: BoardLoc) -> list[Move]:
+    position = as_position(board)
+    piece = position.piece_at(start)
+    if piece == EMPTY:
         return []
-
-    if is_pawn(piece):
-        return get_pawn_moves(board, start)
-    elif is_knight(piece):
-        return get_knight_moves(board, start)
-    elif is_bishop(piece):
-        return get_bishop_moves(board, start)
-    elif is_rook(piece):
-        return get_rook_moves(board, start)
-    elif is_queen(piece):
-        return get_queen_moves(board, start)
-
-    return []
+    return _MOVES[PIECE_TYPES[piece]](position, start)
+
+
+class PreviewCache:
+    """Bounded LRU cache of get_possible_moves results.
+
+    Entries are keyed by (position hash, square). The Zobrist hash covers the
+    pieces, side to move, castling rights and en passant square, so after a
+    move, undo or teleport the new position just misses and the old entries
+    age out; nothing has to be invalidated by hand. Going back to an earlier
+    position (undo) finds its entries again.
+
+    The returned lists are shared between calls and must not be modified.
+    """
+
+    def __init__(self, size: int = 512):
+        self.size = size
+        self.entries: OrderedDict[tuple[int, BoardLoc], list[Move]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_possible_moves(self, position: Position, start: BoardLoc) -> list[Move]:
+        key = (position.hash, start)
+        moves = self.entries.get(key)
+        if moves is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return moves
+        self.misses += 1
+        moves = self.entries[key] = get_possible_moves(position, start)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)  # least recently used
+        return moves
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,471 @@
+from attacks import (
+    BETWEEN,
+    BISHOP_MASKS,
+    BISHOP_TABLES,
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    LINE,
+    PAWN_ATTACKS,
+    ROOK_MASKS,
+    ROOK_TABLES,
+    attack_map,
+    bishop_attacks,
+    is_square_attacked,
+    queen_attacks,
+    rook_attacks,
+)
+from bitboard import (
+    BLACK_KINGSIDE,
+    BLACK_QUEENSIDE,
+    FULL,
+    NO_SQUARE,
+    RANK_2,
+    RANK_7,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    Position,
+    iter_squares,
+    north,
+    north_east,
+    north_west,
+    south,
+    south_east,
+    south_west,
+)
+from moves import (
+    CAPTURE,
+    DOUBLE_PUSH,
+    EN_PASSANT,
+    FLAG_SHIFT,
+    KING_CASTLE,
+    PROMOTION_FLAGS,
+    QUEEN_CASTLE,
+    encode_move,
+)
+from pieces import BLACK_KING, BLACK_PIECES, EMPTY, WHITE_KING, WHITE_PIECES
+
+RANK_1 = RANK_2 << 8
+RANK_8 = RANK_7 >> 8
+PROMOTION_RANKS = RANK_1 | RANK_8
+
+
+_CAPTURE_FLAGS = CAPTURE << FLAG_SHIFT
+_DOUBLE_PUSH_FLAGS = DOUBLE_PUSH << FLAG_SHIFT
+_EN_PASSANT_FLAGS = EN_PASSANT << FLAG_SHIFT
+# flag bits of the four promotions, best first, plain and capturing
+_PROMOTIONS = tuple(flags << FLAG_SHIFT for flags in PROMOTION_FLAGS)
+_CAPTURE_PROMOTIONS = tuple(
+    (flags | CAPTURE) << FLAG_SHIFT for flags in PROMOTION_FLAGS
+)
+
+
+def _pins_and_checkers(
+    position: Position, is_white: bool, king: int
+) -> tuple[int, int]:
+    # enemy pieces attacking the king, and our pieces standing alone
+    # between the king and an enemy slider
+    bitboards = position.bitboards
+    occupied = position.occupied
+    pawn, knight, bishop, rook, queen, _ = BLACK_PIECES if is_white else WHITE_PIECES
+    diagonal = bitboards[bishop] | bitboards[queen]
+    straight = bitboards[rook] | bitboards[queen]
+    checkers = (
+        PAWN_ATTACKS[is_white][king] & bitboards[pawn]
+        | KNIGHT_ATTACKS[king] & bitboards[knight]
+        | BISHOP_TABLES[king][occupied & BISHOP_MASKS[king]] & diagonal
+        | ROOK_TABLES[king][occupied & ROOK_MASKS[king]] & straight
+    )
+
+    # look through our own pieces for sliders lined up with the king
+    enemy = position.enemy(is_white)
+    snipers = (
+        BISHOP_TABLES[king][enemy & BISHOP_MASKS[king]] & diagonal
+        | ROOK_TABLES[king][enemy & ROOK_MASKS[king]] & straight
+    )
+    own = position.friendly(is_white)
+    pinned = 0
+    for sniper in iter_squares(snipers & ~checkers):
+        blockers = BETWEEN[king][sniper] & occupied
+        if not blockers & (blockers - 1):
+            pinned |= blockers & own
+    return pinned, checkers
+
+
+def pins_and_evasions(position: Position, is_white: bool) -> tuple[int, int, int]:
+    """(pinned, evasions, king square) for one side.
+
+    pinned are the side's pieces that may only move along the line through
+    their king, evasions the squares its other pieces may move to (every
+    square when not in check, the checker and the squares in between in
+    single check, none in double check). Like attacks.attack_map the result
+    is cached on the position under its hash, so the per-piece queries of
+    logic_check scan for pins and checks once per position.
+    """
+    side = 1 if is_white else 0
+    key = position.hash
+    if position.pin_keys[side] == key:
+        return position.pins[side]
+    kings = position.bitboards[WHITE_KING if is_white else BLACK_KING]
+    king_square = kings.bit_length() - 1
+    pinned = checkers = 0
+    if kings:
+        pinned, checkers = _pins_and_checkers(position, is_white, king_square)
+    if checkers & (checkers - 1):
+        evasions = 0  # double check
+    elif checkers:
+        evasions = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+    else:
+        evasions = FULL
+    pins = (pinned, evasions, king_square)
+    position.pin_keys[side] = key
+    position.pins[side] = pins
+    return pins
+
+
+def _pawn_moves(
+    moves,
+    pawns: int,
+    is_white: bool,
+    empty: int,
+    targets: int,
+    captures_only: bool,
+) -> None:
+    # pawns are generated for the whole set at once with shifts; the start
+    # square is recovered from the shift distance. Captures have to land on
+    # an enemy piece in targets, pushes on an empty square in targets
+    add = moves.append
+    enemy = ~empty & targets
+    if is_white:
+        single = north(pawns) & empty
+        double = north(single & (RANK_2 >> 8)) & empty
+        left = north_west(pawns) & enemy  # start = end + 9
+        right = north_east(pawns) & enemy  # start = end + 7
+        forward, left_step, right_step = 8, 9, 7
+    else:
+        single = south(pawns) & empty
+        double = south(single & (RANK_7 << 8)) & empty
+        left = south_west(pawns) & enemy  # start = end - 7
+        right = south_east(pawns) & enemy  # start = end - 9
+        forward, left_step, right_step = -8, -7, -9
+
+    for captures, step in ((left, left_step), (right, right_step)):
+        for end in iter_squares(captures & ~PROMOTION_RANKS):
+            add(end + step | end << 6 | _CAPTURE_FLAGS)
+        for end in iter_squares(captures & PROMOTION_RANKS):
+            move = end + step | end << 6
+            for flags in _CAPTURE_PROMOTIONS:
+                add(move | flags)
+    if captures_only:
+        return
+    single &= targets
+    double &= targets
+    for end in iter_squares(single & PROMOTION_RANKS):
+        move = end + forward | end << 6
+        for flags in _PROMOTIONS:
+            add(move | flags)
+    for end in iter_squares(single & ~PROMOTION_RANKS):
+        add(end + forward | end << 6)
+    for end in iter_squares(double):
+        add(end + 2 * forward | end << 6 | _DOUBLE_PUSH_FLAGS)
+
+
+def _legal_moves(
+    position: Position,
+    is_white: bool,
+    captures_only: bool,
+    moves,
+    pieces: int = FULL,
+) -> None:
+    # Only legal moves are generated, nothing is played to test it:
+    #   - in double check only the king can move
+    #   - in single check every other piece has to capture the checker or
+    #     step in between it and the king
+    #   - a pinned piece can only move along the line through its king
+    #   - the king avoids every square in the enemy's attack map
+    # En passant is the one exception, see below. pieces limits the moves
+    # to the ones starting on those squares. The packed moves are appended
+    # to moves, a list or an array("H").
+    add = moves.append
+    bitboards = position.bitboards
+    occupied = position.occupied
+    own = position.friendly(is_white)
+    enemy = position.enemy(is_white)
+    empty = ~occupied
+    pawn, knight, bishop, rook, queen, king = WHITE_PIECES if is_white else BLACK_PIECES
+
+    kings = bitboards[king]
+    king_square = kings.bit_length() - 1
+    pinned = checkers = 0
+    if kings:
+        pinned, checkers = _pins_and_checkers(position, is_white, king_square)
+    if checkers & (checkers - 1):
+        evasions = 0  # double check
+    elif checkers:
+        evasions = checkers | BETWEEN[king_square][checkers.bit_length() - 1]
+    else:
+        evasions = FULL
+
+    if evasions:
+        own_pieces = own & pieces
+        free = own_pieces & ~pinned
+        pawns = bitboards[pawn]
+        # own pieces are never targets: captures need an enemy piece and
+        # pushes an empty square
+        targets = evasions & ~own
+        _pawn_moves(moves, pawns & free, is_white, empty, targets, captures_only)
+        for start in iter_squares(pawns & own_pieces & pinned):
+            line = targets & LINE[king_square][start]
+            _pawn_moves(moves, 1 << start, is_white, empty, line, captures_only)
+        ep_square = position.ep_square
+        # the en passant square only belongs to the side to move; asked about
+        # the other side (a move preview), there's no capture to consider
+        if ep_square != NO_SQUARE and is_white == position.white_to_move:
+            # en passant empties two squares on the capturing pawn's rank,
+            # which can expose the king sideways, so these few moves are
+            # still played and tested. Pawns that could capture onto the en
+            # passant square are exactly the squares an enemy pawn there
+            # would attack
+            attackers = PAWN_ATTACKS[not is_white][ep_square] & pawns & pieces
+            for start in iter_squares(attackers):
+                move = start | ep_square << 6 | _EN_PASSANT_FLAGS
+                position.make(move)
+                legal = not kings or not is_square_attacked(
+                    position, bitboards[king].bit_length() - 1, not is_white
+                )
+                position.unmake_move()
+                if legal:
+                    add(move)
+
+        # captures and quiet moves of a piece are added separately, so the
+        # capture flag doesn't have to be worked out square by square
+        captures = enemy & evasions
+        quiet = 0 if captures_only else empty & evasions
+        for start in iter_squares(bitboards[knight] & free):
+            attacks = KNIGHT_ATTACKS[start]
+            for end in iter_squares(attacks & captures):
+                add(start | end << 6 | _CAPTURE_FLAGS)
+            for end in iter_squares(attacks & quiet):
+                add(start | end << 6)
+        diagonal = (bitboards[bishop] | bitboards[queen]) & own_pieces
+        for start in iter_squares(diagonal):
+            attacks = BISHOP_TABLES[start][occupied & BISHOP_MASKS[start]]
+            if pinned >> start & 1:
+                attacks &= LINE[king_square][start]
+            for end in iter_squares(attacks & captures):
+                add(start | end << 6 | _CAPTURE_FLAGS)
+            for end in iter_squares(attacks & quiet):
+                add(start | end << 6)
+        straight = (bitboards[rook] | bitboards[queen]) & own_pieces
+        for start in iter_squares(straight):
+            attacks = ROOK_TABLES[start][occupied & ROOK_MASKS[start]]
+            if pinned >> start & 1:
+                attacks &= LINE[king_square][start]
+            for end in iter_squares(attacks & captures):
+                add(start | end << 6 | _CAPTURE_FLAGS)
+            for end in iter_squares(attacks & quiet):
+                add(start | end << 6)
+
+    if not kings & pieces:
+        return
+    # the attack map sees through the king, so it also covers the squares
+    # behind the king on a checking ray
+    safe = KING_ATTACKS[king_square] & ~attack_map(position, not is_white)
+    for end in iter_squares(safe & enemy):
+        add(king_square | end << 6 | _CAPTURE_FLAGS)
+    if captures_only:
+        return
+    for end in iter_squares(safe & empty):
+        add(king_square | end << 6)
+    if not checkers:
+        castling_moves(position, king_square, is_white, moves)
+
+
+def castling_moves(position: Position, king: int, is_white: bool, moves) -> None:
+    # the king may not castle out of, through or into check, and every
+    # square between king and rook has to be empty
+    if is_white:
+        kingside, queenside = WHITE_KINGSIDE, WHITE_QUEENSIDE
+    else:
+        kingside, queenside = BLACK_KINGSIDE, BLACK_QUEENSIDE
+    rights = position.castling
+    if not rights & (kingside | queenside):
+        return
+    occupied = position.occupied
+    attacked = attack_map(position, not is_white)
+    if attacked >> king & 1:
+        return
+    if (
+        rights & kingside
+        and not occupied & (0b11 << (king + 1))
+        and not attacked & (0b11 << (king + 1))
+    ):
+        moves.append(encode_move(king, king + 2, KING_CASTLE))
+    if (
+        rights & queenside
+        and not occupied & (0b111 << (king - 3))
+        and not attacked & (0b11 << (king - 2))
+    ):
+        moves.append(encode_move(king, king - 2, QUEEN_CASTLE))
+
+
+def generate_moves(position: Position, is_white: bool | None = None, moves=None):
+    """Every legal move for one side (default: side to move), packed.
+
+    The moves (see moves.py) are appended to moves, a list or array("H")
+    the caller keeps around and clears between uses, or to a new list if
+    none is given; either way it's returned. A move can be played with
+    Position.make.
+    """
+    if is_white is None:
+        is_white = position.white_to_move
+    if moves is None:
+        moves = []
+    _legal_moves(position, is_white, False, moves)
+    return moves
+
+
+def generate_captures(position: Position, is_white: bool | None = None, moves=None):
+    """Like generate_moves, but only captures (including en passant)."""
+    if is_white is None:
+        is_white = position.white_to_move
+    if moves is None:
+        moves = []
+    _legal_moves(position, is_white, True, moves)
+    return moves
+
+
+def legal_targets(
+    position: Position, square: int, is_white: bool | None = None
+) -> int:
+    # bitboard of the squares the piece on square can legally move to
+    if is_white is None:
+        is_white = position.white_to_move
+    moves = []
+    _legal_moves(position, is_white, False, moves, 1 << square)
+    targets = 0
+    for move in moves:
+        targets |= 1 << (move >> 6 & 63)
+    return targets
+
+
+def has_legal_move(position: Position, is_white: bool | None = None) -> bool:
+    # the king's moves first: most positions have one, and they're cheap to
+    # find. Only if the king is stuck are the other pieces' moves generated,
+    # in one go; per piece would stop sooner, but costs a pin and check scan
+    # each, which makes checkmates and stalemates much slower
+    if is_white is None:
+        is_white = position.white_to_move
+    kings = position.bitboards[WHITE_KING if is_white else BLACK_KING]
+    moves = []
+    _legal_moves(position, is_white, False, moves, kings)
+    if not moves:
+        _legal_moves(position, is_white, False, moves, FULL & ~kings)
+    return bool(moves)
+
+
+def is_in_check(position: Position, is_white: bool | None = None) -> bool:
+    if is_white is None:
+        is_white = position.white_to_move
+    king = position.bitboards[WHITE_KING if is_white else BLACK_KING]
+    return bool(king & attack_map(position, not is_white))
+
+
+def reference_moves(position: Position) -> list[int]:
+    """Every legal move of the side to move, worked out the slow way.
+
+    Each pseudo-legal move is played and kept if it doesn't leave the own
+    king attacked, and castling checks the king's path square by square.
+    Nothing but the attack tables is shared with generate_moves, so the
+    validators compare the two to test the pins, check evasions, en passant
+    and castling rules.
+    """
+    is_white = position.white_to_move
+    pawn, knight, bishop, rook, queen, king = WHITE_PIECES if is_white else BLACK_PIECES
+    bitboards = position.bitboards
+    occupied = position.occupied
+    own = position.friendly(is_white)
+    enemy = position.enemy(is_white)
+    # (start, end, promotion) of every pseudo-legal move
+    candidates = []
+
+    forward, home_row, last_row = (-8, 6, 0) if is_white else (8, 1, 7)
+    for start in iter_squares(bitboards[pawn]):
+        ends = []
+        one = start + forward
+        if not occupied >> one & 1:
+            ends.append(one)
+            two = one + forward
+            if start >> 3 == home_row and not occupied >> two & 1:
+                ends.append(two)
+        for end in iter_squares(PAWN_ATTACKS[is_white][start]):
+            if enemy >> end & 1 or end == position.ep_square:
+                ends.append(end)
+        for end in ends:
+            if end >> 3 == last_row:
+                for promotion in (knight, bishop, rook, queen):
+                    candidates.append((start, end, promotion))
+            else:
+                candidates.append((start, end, EMPTY))
+
+    for piece, targets in (
+        (knight, lambda square: KNIGHT_ATTACKS[square]),
+        (bishop, lambda square: bishop_attacks(square, occupied)),
+        (rook, lambda square: rook_attacks(square, occupied)),
+        (queen, lambda square: queen_attacks(square, occupied)),
+        (king, lambda square: KING_ATTACKS[square]),
+    ):
+        for start in iter_squares(bitboards[piece]):
+            for end in iter_squares(targets(start) & ~own):
+                candidates.append((start, end, EMPTY))
+
+    # the king's home square, the rights, and the corner each right needs
+    home = 60 if is_white else 4
+    if bitboards[king] >> home & 1:
+        for right, corner, step in (
+            (WHITE_KINGSIDE if is_white else BLACK_KINGSIDE, home + 3, 1),
+            (WHITE_QUEENSIDE if is_white else BLACK_QUEENSIDE, home - 4, -1),
+        ):
+            if not position.castling & right or not bitboards[rook] >> corner & 1:
+                continue
+            between = range(home + step, corner, step)
+            if any(occupied >> square & 1 for square in between):
+                continue
+            # not out of, through or into check
+            path = (home, home + step, home + 2 * step)
+            if any(is_square_attacked(position, sq, not is_white) for sq in path):
+                continue
+            candidates.append((home, home + 2 * step, EMPTY))
+
+    moves = []
+    for start, end, promotion in candidates:
+        move = position.encode_move(start, end, promotion)
+        position.make(move)
+        king_square = bitboards[king].bit_length() - 1
+        if king_square < 0 or not is_square_attacked(
+            position, king_square, not is_white
+        ):
+            moves.append(move)
+        position.unmake_move()
+    return moves
+
+
+def _square_name(square: int) -> str:
+    return "abcdefgh"[square & 7] + str(8 - (square >> 3))
+
+
+def compare_with_reference(position: Position) -> str | None:
+    # what generate_moves gets wrong compared to reference_moves, if anything
+    generated = set(generate_moves(position))
+    reference = set(reference_moves(position))
+    if generated == reference:
+        return None
+    problems = []
+    extra, missing = generated - reference, reference - generated
+    for label, moves in (("generates", extra), ("misses", missing)):
+        if moves:
+            names = sorted(
+                _square_name(move & 63) + _square_name(move >> 6 & 63)
+                for move in moves
+            )
+            problems.append(f"{label} {' '.join(names)}")
+    return "move generator " + ", ".join(problems)
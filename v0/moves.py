@@ -0,0 +1,70 @@
+from array import array
+
+# Moves are packed into 16-bit integers:
+#
+#   bits  0-5   start square
+#   bits  6-11  end square
+#   bits 12-15  flags, what kind of move it is
+#
+# The flags follow the usual from-to layout: the capture bit (4) is set on
+# every capture, the promotion bit (8) on every promotion, and the two low
+# bits of a promotion give the piece it promotes to. A move is never 0 (that
+# would be a8a8), so 0 can stand for "no move", as in the transposition table.
+#
+# Integers are cheap to create, compare and hash and, unlike tuples, aren't
+# tracked by the garbage collector, so the generators can produce hundreds of
+# thousands of them per second without putting pressure on it.
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EN_PASSANT = 5
+PROMOTION = 8
+# promotion flags, the piece is flags & 3
+KNIGHT_PROMOTION = 8
+BISHOP_PROMOTION = 9
+ROOK_PROMOTION = 10
+QUEEN_PROMOTION = 11
+
+FLAG_SHIFT = 12
+END_SHIFT = 6
+SQUARE_MASK = 63
+
+# the order the generator tries promotions in, best first
+PROMOTION_FLAGS = (QUEEN_PROMOTION, ROOK_PROMOTION, BISHOP_PROMOTION, KNIGHT_PROMOTION)
+# letters of the promotion pieces, indexed by flags & 3
+PROMOTION_LETTERS = "nbrq"
+
+MAX_PLY = 128  # deeper than any search, quiescence included, can get
+
+
+def encode_move(start: int, end: int, flags: int = QUIET) -> int:
+    return start | end << END_SHIFT | flags << FLAG_SHIFT
+
+
+def move_start(move: int) -> int:
+    return move & SQUARE_MASK
+
+
+def move_end(move: int) -> int:
+    return move >> END_SHIFT & SQUARE_MASK
+
+
+def move_flags(move: int) -> int:
+    return move >> FLAG_SHIFT
+
+
+def is_capture(move: int) -> bool:
+    return bool(move >> FLAG_SHIFT & CAPTURE)
+
+
+def is_promotion(move: int) -> bool:
+    return bool(move >> FLAG_SHIFT & PROMOTION)
+
+
+def move_buffers(plies: int = MAX_PLY) -> list[array]:
+    # one preallocated move array per ply. A search or perft at ply n fills
+    # buffers[n] while the moves of the plies above it are still being
+    # played, so nothing is allocated per node
+    return [array("H") for _ in range(plies)]
@@ -0,0 +1,186 @@
+import argparse
+import json
+import platform
+import time
+from datetime import datetime, timezone
+
+from bitboard import Position
+from engine import move_to_notation, to_engine_move
+from fen import STARTING_FEN, position_from_fen
+from movegen import generate_moves
+from moves import move_buffers
+
+# Well-known perft positions with their published leaf counts per depth
+# (see the Chess Programming Wiki "Perft Results" page), as (FEN, counts).
+PERFT_POSITIONS = {
+    "startpos": (STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        [48, 2039, 97862, 4085603],
+    ),
+    "position3": (
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        [14, 191, 2812, 43238, 674624],
+    ),
+    "position4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        [6, 264, 9467, 422333],
+    ),
+    "position5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        [44, 1486, 62379, 2103487],
+    ),
+    "position6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        [46, 2079, 89890, 3894594],
+    ),
+}
+
+
+def load_position(name: str) -> Position:
+    return position_from_fen(PERFT_POSITIONS[name][0])
+
+
+def perft(position: Position, depth: int, buffers: list | None = None) -> int:
+    # number of leaf nodes of the legal move tree, depth plies deep. Every
+    # ply generates into its own preallocated move array
+    if buffers is None:
+        buffers = move_buffers(depth + 1)
+    if depth == 0:
+        return 1
+    moves = buffers[depth]
+    del moves[:]
+    generate_moves(position, moves=moves)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make(move)
+        nodes += perft(position, depth - 1, buffers)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position: Position, depth: int) -> dict[str, int]:
+    # perft split by root move, the usual way to hunt down a wrong count
+    counts = {}
+    buffers = move_buffers(depth)
+    for move in generate_moves(position):
+        notation = move_to_notation(to_engine_move(position, move))
+        position.make(move)
+        counts[notation] = perft(position, depth - 1, buffers)
+        position.unmake_move()
+    return counts
+
+
+def run(name: str, depth: int, show_divide: bool) -> bool:
+    position = load_position(name)
+    expected = PERFT_POSITIONS[name][1]
+    print(f"{name}:")
+    if show_divide:
+        counts = divide(position, depth)
+        for notation, count in counts.items():
+            print(f"  {notation}: {count}")
+        print(f"  moves {len(counts)} nodes {sum(counts.values())}")
+
+    ok = True
+    for current in range(1, depth + 1):
+        started = time.perf_counter()
+        nodes = perft(position, current)
+        seconds = time.perf_counter() - started
+        nps = nodes / seconds if seconds else 0
+        status = ""
+        if current <= len(expected):
+            status = "ok" if nodes == expected[current - 1] else "WRONG"
+            ok = ok and status == "ok"
+        print(
+            f"  depth {current}: {nodes} nodes in {seconds:.3f}s "
+            f"({nps:.0f} nodes/s) {status}"
+        )
+    return ok
+
+
+def bench(depth: int, output: str, label: str | None) -> bool:
+    # run every position to the same depth and append the results to a JSON
+    # file, comparing nodes/s against the previous run recorded there
+    try:
+        with open(output) as f:
+            runs = json.load(f)
+    except FileNotFoundError:
+        runs = []
+    previous = runs[-1]["positions"] if runs else {}
+
+    results = {}
+    ok = True
+    total_nodes = 0
+    total_seconds = 0.0
+    for name in PERFT_POSITIONS:
+        position = load_position(name)
+        expected = PERFT_POSITIONS[name][1]
+        started = time.perf_counter()
+        nodes = perft(position, depth)
+        seconds = time.perf_counter() - started
+        correct = depth > len(expected) or nodes == expected[depth - 1]
+        ok = ok and correct
+        total_nodes += nodes
+        total_seconds += seconds
+        results[name] = {
+            "depth": depth,
+            "nodes": nodes,
+            "seconds": round(seconds, 4),
+            "nps": round(nodes / seconds),
+            "correct": correct,
+        }
+        change = ""
+        if name in previous and previous[name]["depth"] == depth:
+            ratio = results[name]["nps"] / previous[name]["nps"]
+            change = f" ({ratio - 1:+.1%} vs previous run)"
+        print(
+            f"{name}: {nodes} nodes in {seconds:.3f}s, "
+            f"{results[name]['nps']} nodes/s{change}"
+            + ("" if correct else " WRONG COUNT")
+        )
+    print(f"total: {total_nodes} nodes, {total_nodes / total_seconds:.0f} nodes/s")
+
+    runs.append(
+        {
+            "label": label,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "depth": depth,
+            "nps": round(total_nodes / total_seconds),
+            "positions": results,
+        }
+    )
+    with open(output, "w") as f:
+        json.dump(runs, f, indent=2)
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move generation perft")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--position",
+        choices=list(PERFT_POSITIONS),
+        action="append",
+        help="position to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--divide", action="store_true", help="show node counts per root move"
+    )
+    parser.add_argument(
+        "--bench",
+        metavar="FILE",
+        help="run every position at --depth and append the results to FILE",
+    )
+    parser.add_argument("--label", help="name for this run in the bench file")
+    args = parser.parse_args()
+
+    if args.bench:
+        passed = bench(args.depth, args.bench, args.label)
+    else:
+        names = args.position or list(PERFT_POSITIONS)
+        # run them all even if an early one fails
+        passed = all([run(name, args.depth, args.divide) for name in names])
+    raise SystemExit(0 if passed else 1)
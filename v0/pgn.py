@@ -0,0 +1,337 @@
+import argparse
+import mmap
+import random
+import re
+import sys
+import time
+from typing import Iterable, Iterator, NamedTuple
+
+from attacks import KNIGHT_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+from bitboard import FILE_A, RANK_8, Position, iter_squares
+from fen import STARTING_FEN, position_from_fen
+from logic_check import get_targets
+from movegen import (
+    compare_with_reference,
+    generate_moves,
+    is_in_check,
+    reference_moves,
+)
+from moves import PROMOTION, move_end, move_flags, move_start
+from pieces import BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, TYPE_MASK
+from progress import Progress
+
+# Portable Game Notation: every game is a block of tag pairs followed by its
+# moves in SAN (standard algebraic notation), with move numbers, comments,
+# NAGs and variations mixed in:
+#
+#   [Event "Casual game"]
+#   [White "..."]
+#
+#   1. e4 e5 2. Nf3 {the usual} Nc6 (2... d6 3. d4) 3. Bb5 a6 1-0
+#
+# Archives run to gigabytes, so games are read one at a time from a memory
+# mapped file and handed out as the raw tags and movetext; the moves are only
+# tokenized while a game is replayed, one position being played forward.
+
+
+class Game(NamedTuple):
+    offset: int  # byte offset of the game's first line in the archive
+    tags: dict[str, str]
+    movetext: str
+
+
+class Replay(NamedTuple):
+    plies: int  # moves played, up to the first illegal one
+    error: str | None  # the first illegal move and why, None if there was none
+
+
+_GAME_START = re.compile(rb"\n[ \t\r]*\n\[")
+_TAG = re.compile(rb'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# comments, variation brackets, NAGs, move numbers, and everything else,
+# which should be a move or a result
+_TOKENS = re.compile(r"\{[^}]*\}?|;[^\n]*|[()]|\$\d+|\d+\.+|[^\s{}();]+")
+_RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+_SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h])([1-8])(?:=?([NBRQ]))?")
+_KINDS = {None: PAWN, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+_CASTLES = {"O-O": 2, "O-O-O": -2, "0-0": 2, "0-0-0": -2}
+_FILE_MASKS = {file: FILE_A << col for col, file in enumerate("abcdefgh")}
+_RANK_MASKS = {rank: RANK_8 << (8 - int(rank)) * 8 for rank in "12345678"}
+_LAST_RANKS = RANK_8 | RANK_8 << 56
+_SAN_LETTERS = ("", "", "N", "B", "R", "Q", "K")
+# the squares a piece of each kind could reach end from, given the occupied
+# squares, to narrow down the candidates before asking for legal targets
+_REACHES = {
+    KNIGHT: lambda end, occupied: KNIGHT_ATTACKS[end],
+    BISHOP: bishop_attacks,
+    ROOK: rook_attacks,
+    QUEEN: queen_attacks,
+}
+
+
+def read_games(path: str, start: int = 0, end: int | None = None) -> Iterator[Game]:
+    """Yield the games of a PGN file one by one.
+
+    The file is memory mapped rather than read, so only the pages of the
+    games being looked at have to be in memory. With start and end only the
+    games between the first game boundaries at or after each of them are
+    read, so splitting a file at any offsets hands every game to exactly one
+    of the parts.
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # an empty file can't be mapped, and has no games anyway
+        with data:
+            if start:
+                start = _next_game(data, start)
+            stop = len(data) if end is None else _next_game(data, end)
+            data.seek(start)
+            for game in parse_games(iter(data.readline, b""), start):
+                if game.offset >= stop:
+                    break
+                yield game
+
+
+def _next_game(data: mmap.mmap, offset: int) -> int:
+    # the first tag line after a blank line, looking from offset on
+    match = _GAME_START.search(data, offset)
+    return match.end() - 1 if match else len(data)
+
+
+def parse_games(lines: Iterable[bytes], offset: int = 0) -> Iterator[Game]:
+    # games from the lines of a PGN file, the first line at offset; a game
+    # ends where the tags of the next one start, or at the end of the input
+    tags: dict[str, str] = {}
+    movetext: list[bytes] = []
+    start = offset
+    separated = False  # a blank line after the tags and before any moves
+    for line in lines:
+        size = len(line)
+        line = line.strip()
+        if not line:
+            separated = bool(tags) and not movetext
+        elif line[0] == 0x5B:  # "["
+            if movetext or separated:
+                yield _game(start, tags, movetext)
+                tags, movetext, separated = {}, [], False
+            if not tags:
+                start = offset
+            for name, value in _TAG.findall(line):
+                tags[name.decode()] = _unescape(value)
+        elif line[0] != 0x25:  # "%" escapes a line from another program
+            if not tags and not movetext:
+                start = offset
+            movetext.append(line)
+        offset += size
+    if tags or movetext:
+        yield _game(start, tags, movetext)
+
+
+def _game(offset: int, tags: dict[str, str], movetext: list[bytes]) -> Game:
+    return Game(offset, tags, b"\n".join(movetext).decode(errors="replace"))
+
+
+def _unescape(value: bytes) -> str:
+    if b"\\" in value:
+        value = value.replace(b'\\"', b'"').replace(b"\\\\", b"\\")
+    return value.decode(errors="replace")
+
+
+def iter_sans(movetext: str) -> Iterator[str]:
+    # the moves of the main line, up to the result
+    depth = 0
+    for token in _TOKENS.findall(movetext):
+        first = token[0]
+        if first == "(":
+            depth += 1
+        elif first == ")":
+            depth = max(depth - 1, 0)
+        elif depth or first in "{;$" or token[-1] == ".":
+            continue
+        elif token in _RESULTS:
+            return
+        else:
+            yield token
+
+
+def resolve_san(position: Position, san: str) -> int:
+    """Find the legal move san stands for and return it packed.
+
+    Raises ValueError if san isn't a move, or isn't exactly one legal move
+    of the side to move.
+    """
+    is_white = position.white_to_move
+    side = 0 if is_white else BLACK
+    text = san.rstrip("+#!?")
+    promotion = None
+    if text in _CASTLES:
+        kind = KING
+        candidates = position.bitboards[KING | side]
+        end = candidates.bit_length() - 1 + _CASTLES[text]
+    else:
+        match = _SAN.fullmatch(text)
+        if match is None:
+            raise ValueError(f"Invalid move: {san}")
+        letter, file, rank, end_file, end_rank, promotion = match.groups()
+        kind = _KINDS[letter]
+        candidates = position.bitboards[kind | side]
+        if file:
+            candidates &= _FILE_MASKS[file]
+        elif kind == PAWN:
+            # a pawn without a file given is pushed, so it's on the same file
+            candidates &= _FILE_MASKS[end_file]
+        if rank:
+            candidates &= _RANK_MASKS[rank]
+        end = (8 - int(end_rank)) * 8 + "abcdefgh".index(end_file)
+        if candidates & (candidates - 1) and kind in _REACHES:
+            candidates &= _REACHES[kind](end, position.occupied)
+
+    start = -1
+    for square in iter_squares(candidates):
+        if get_targets(position, square) >> end & 1:
+            if start >= 0:
+                raise ValueError(f"Ambiguous move: {san}")
+            start = square
+    if start < 0:
+        raise ValueError(f"Illegal move: {san}")
+    promotes = kind == PAWN and bool(_LAST_RANKS >> end & 1)
+    if promotes != (promotion is not None):
+        raise ValueError(f"Illegal move: {san}")
+    return position.encode_move(start, end, _KINDS[promotion] if promotion else 0)
+
+
+def move_to_san(position: Position, move: int) -> str:
+    # SAN of a legal move of the side to move
+    start, end, flags = move_start(move), move_end(move), move_flags(move)
+    kind = position.squares[start] & TYPE_MASK
+    target = "abcdefgh"[end & 7] + str(8 - (end >> 3))
+    if kind == KING and abs(end - start) == 2:
+        san = "O-O" if end > start else "O-O-O"
+    elif kind == PAWN:
+        if start & 7 != end & 7:
+            san = "abcdefgh"[start & 7] + "x" + target
+        else:
+            san = target
+        if flags & PROMOTION:
+            san += "=" + "NBRQ"[flags & 3]
+    else:
+        # add the file, the rank or both if other pieces of the kind can go
+        # to the same square
+        others = [
+            other
+            for other in generate_moves(position)
+            if move_end(other) == end
+            and move_start(other) != start
+            and position.squares[move_start(other)] == position.squares[start]
+        ]
+        prefix = ""
+        if others:
+            if all(move_start(other) & 7 != start & 7 for other in others):
+                prefix = "abcdefgh"[start & 7]
+            elif all(move_start(other) >> 3 != start >> 3 for other in others):
+                prefix = str(8 - (start >> 3))
+            else:
+                prefix = "abcdefgh"[start & 7] + str(8 - (start >> 3))
+        capture = "x" if position.squares[end] else ""
+        san = _SAN_LETTERS[kind] + prefix + capture + target
+    position.make(move)
+    if is_in_check(position):
+        san += "#" if not generate_moves(position) else "+"
+    position.unmake_move()
+    return san
+
+
+def replay_game(game: Game, check: bool = False) -> Replay:
+    """Play through the main line of a game, stopping at the first illegal move.
+
+    Moves are matched against the legal targets logic_check gives each piece.
+    With check, the legal moves of every position are also worked out the
+    slow way (movegen.reference_moves, every move played and tested): the
+    game's move has to be one of them, and the move generator has to come
+    up with exactly the same moves.
+    """
+    try:
+        position = position_from_fen(game.tags.get("FEN") or STARTING_FEN)
+    except ValueError as e:
+        return Replay(0, str(e))
+    plies = 0
+    for san in iter_sans(game.movetext):
+        try:
+            move = resolve_san(position, san)
+        except ValueError as e:
+            return Replay(plies, f"ply {plies + 1}: {e}")
+        if check:
+            if move not in reference_moves(position):
+                return Replay(plies, f"ply {plies + 1}: {san} is not a legal move")
+            problem = compare_with_reference(position)
+            if problem:
+                return Replay(plies, f"ply {plies + 1}: {problem}")
+        position.make(move)
+        plies += 1
+    return Replay(plies, None)
+
+
+def random_games(count: int, seed: int = 0) -> Iterator[str]:
+    # PGN of random games, to benchmark with when there's no archive at hand
+    rng = random.Random(seed)
+    for number in range(count):
+        position = position_from_fen(STARTING_FEN)
+        sans = []
+        for ply in range(rng.randrange(20, 160)):
+            moves = generate_moves(position)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            if ply % 2 == 0:
+                sans.append(f"{ply // 2 + 1}.")
+            sans.append(move_to_san(position, move))
+            position.make(move)
+        yield f'[Event "Random game {number + 1}"]\n\n{" ".join(sans)} *\n\n'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay and validate PGN files")
+    parser.add_argument(
+        "files", nargs="*", help="PGN files (default: 1,000 random games)"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="also check every move against independently worked out moves",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="don't report progress on stderr"
+    )
+    args = parser.parse_args()
+
+    if args.files:
+        sources = ((path, read_games(path)) for path in args.files)
+    else:
+        text = "".join(random_games(1000)).encode()
+        sources = iter([("random", parse_games(text.splitlines(keepends=True)))])
+
+    progress = Progress(None, unit="games")
+    games = plies = illegal = 0
+    started = time.perf_counter()
+    for path, archive in sources:
+        for number, game in enumerate(archive, 1):
+            replay = replay_game(game, args.check)
+            games += 1
+            plies += replay.plies
+            if replay.error:
+                illegal += 1
+                print(f"{path}:{game.offset}: game {number}: {replay.error}")
+            if not args.quiet:
+                progress.done = games
+                progress.update()
+    if not args.quiet:
+        progress.update(finished=True)
+    seconds = time.perf_counter() - started
+    print(
+        f"{games} games, {plies} plies, {illegal} with an illegal move "
+        f"in {seconds:.2f}s ({games / seconds:.0f} games/s, "
+        f"{plies / seconds:.0f} plies/s)",
+        file=sys.stderr,
+    )
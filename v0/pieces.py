@@ -0,0 +1,59 @@
+# Pieces are small integers: the piece type in the low three bits and the
+# colour in bit 3, so white pieces are 1-6, black pieces 9-14 and 0 is an
+# empty square. Everything about a piece is a lookup in a 16 entry table
+# indexed by its code, and the Unicode glyphs only come into play when a
+# position is turned into a Board for display (or read from one).
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+BLACK = 8
+TYPE_MASK = 7
+
+WHITE_PAWN = PAWN
+WHITE_KNIGHT = KNIGHT
+WHITE_BISHOP = BISHOP
+WHITE_ROOK = ROOK
+WHITE_QUEEN = QUEEN
+WHITE_KING = KING
+BLACK_PAWN = BLACK | PAWN
+BLACK_KNIGHT = BLACK | KNIGHT
+BLACK_BISHOP = BLACK | BISHOP
+BLACK_ROOK = BLACK | ROOK
+BLACK_QUEEN = BLACK | QUEEN
+BLACK_KING = BLACK | KING
+
+# pawn, knight, bishop, rook, queen, king of each side
+WHITE_PIECES = (
+    WHITE_PAWN,
+    WHITE_KNIGHT,
+    WHITE_BISHOP,
+    WHITE_ROOK,
+    WHITE_QUEEN,
+    WHITE_KING,
+)
+BLACK_PIECES = (
+    BLACK_PAWN,
+    BLACK_KNIGHT,
+    BLACK_BISHOP,
+    BLACK_ROOK,
+    BLACK_QUEEN,
+    BLACK_KING,
+)
+PIECES = WHITE_PIECES + BLACK_PIECES
+
+# lookup tables indexed by piece code
+GLYPHS = ".♙♘♗♖♕♔..♟♞♝♜♛♚."
+PIECE_TYPES = tuple(code & TYPE_MASK if code in PIECES else EMPTY for code in range(16))
+IS_WHITE = tuple(code in WHITE_PIECES for code in range(16))
+IS_BLACK = tuple(code in BLACK_PIECES for code in range(16))
+TYPE_NAMES = ("", "pawn", "knight", "bishop", "rook", "queen", "king")
+# lowercase letters of the piece types, as in coordinate notation (e7e8q)
+TYPE_LETTERS = ("", "p", "n", "b", "r", "q", "k", "")
+
+# glyph to code, for reading a Board; "." is an empty square
+PIECE_CODES = {GLYPHS[code]: code for code in PIECES}
+PIECE_CODES["."] = EMPTY
@@ -0,0 +1,39 @@
+import sys
+import time
+
+
+class Progress:
+    """Throttled progress line on stderr."""
+
+    def __init__(
+        self,
+        total: int | None,
+        done: int = 0,
+        every: float = 1.0,
+        unit: str = "positions",
+    ):
+        self.total = total
+        self.done = done
+        self.start_done = done
+        self.every = every
+        self.started = time.perf_counter()
+        self.last = 0.0
+        self.width = 0
+        self.unit = unit
+
+    def update(self, finished: bool = False) -> None:
+        now = time.perf_counter()
+        if not finished and now - self.last < self.every:
+            return
+        self.last = now
+        elapsed = now - self.started
+        rate = (self.done - self.start_done) / elapsed if elapsed else 0
+        text = f"{self.done}"
+        if self.total is not None:
+            text += f"/{self.total}"
+        text += f" {self.unit}, {rate:.1f}/s"
+        if self.total is not None and rate and not finished:
+            text += f", eta {(self.total - self.done) / rate:.0f}s"
+        # pad over whatever was left of the previous, longer line
+        line, self.width = text.ljust(self.width), len(text)
+        print(f"\r{line}", end="\n" if finished else "", file=sys.stderr, flush=True)
@@ -0,0 +1,52 @@
+import shutil
+import sys
+
+# ANSI escape sequences
+HOME_AND_CLEAR = "\033[H\033[2J"
+CLEAR_LINE_END = "\033[K"  # erase from the cursor to the end of the line
+CLEAR_SCREEN_END = "\033[J"  # erase from the cursor to the end of the screen
+
+
+def move_to(row: int) -> str:
+    # rows are 0 based here, 1 based for the terminal
+    return f"\033[{row + 1};1H"
+
+
+class Renderer:
+    """Draws frames of text to the terminal, redrawing only what changed.
+
+    A frame is a list of lines, which may contain color codes. The first
+    frame is drawn on a cleared screen; after that only the lines that
+    differ from the previous frame are rewritten, each one found by moving
+    the cursor to it directly. Everything below the frame (such as the
+    previous answer to an input prompt) is erased, and the cursor is left
+    on the line after the frame. A frame goes out in a single write.
+    """
+
+    def __init__(self, stream=None) -> None:
+        self.stream = stream if stream is not None else sys.stdout
+        self.previous: list[str] | None = None
+
+    def draw(self, lines: list[str]) -> None:
+        previous = self.previous
+        # a frame taller than the terminal scrolls it, after which the rows
+        # no longer line up with the previous frame
+        if len(lines) >= shutil.get_terminal_size().lines:
+            previous = None
+
+        if previous is None:
+            out = [HOME_AND_CLEAR, "\n".join(lines), "\n"]
+        else:
+            out = []
+            for row, line in enumerate(lines):
+                if row >= len(previous) or previous[row] != line:
+                    out += (move_to(row), line, CLEAR_LINE_END)
+            out.append(move_to(len(lines)))
+        out.append(CLEAR_SCREEN_END)
+        self.stream.write("".join(out))
+        self.stream.flush()
+        self.previous = list(lines)
+
+    def invalidate(self) -> None:
+        # the screen was changed behind our back, redraw it all next time
+        self.previous = None
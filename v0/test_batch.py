@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+from batch import analyse_positions, resume_point
+
+LINES = ["e2e4 e7e5", "", "e2e5", "d2d4 d7d5 c2c4", "e2e4 d7d5 e4d5 d8d5"]
+
+
+def test_analyse_positions():
+    records = list(analyse_positions(LINES, workers=2, depth=2))
+
+    # one record per line, in input order
+    assert [record["index"] for record in records] == [0, 1, 2, 3, 4]
+    assert [record["input"] for record in records] == LINES
+    assert records[2]["error"] == "Illegal move: e2e5"
+    assert records[1]["depth"] == 2
+    assert records[3]["move"] == "d5c4"  # takes the pawn back
+
+    # the same positions give the same results whichever worker runs them
+    assert list(analyse_positions(LINES, workers=1, depth=2)) == records
+
+
+def test_resume_point():
+    handle, path = tempfile.mkstemp()
+    os.close(handle)
+    try:
+        assert resume_point(path) == 0
+        with open(path, "w") as f:
+            f.write('{"index": 0}\n{"index": 1}\n{"ind')
+        # the record cut off mid-write is dropped
+        assert resume_point(path) == 2
+        with open(path) as f:
+            assert f.read() == '{"index": 0}\n{"index": 1}\n'
+    finally:
+        os.remove(path)
+    assert resume_point(path) == 0
+
+
+test_analyse_positions()
+test_resume_point()
@@ -0,0 +1,321 @@
+from bitboard import PROMOTION_PIECES, STARTING_BOARD, Position, loc_to_square
+from logic_check import get_possible_moves
+from movegen import generate_moves, legal_targets
+from moves import (
+    CAPTURE,
+    DOUBLE_PUSH,
+    EN_PASSANT,
+    KING_CASTLE,
+    KNIGHT_PROMOTION,
+    QUEEN_CASTLE,
+    QUEEN_PROMOTION,
+    QUIET,
+    ROOK_PROMOTION,
+    encode_move,
+    is_capture,
+    is_promotion,
+    move_end,
+    move_flags,
+    move_start,
+)
+from pieces import (
+    BLACK_KING,
+    BLACK_PAWN,
+    BLACK_QUEEN,
+    BLACK_ROOK,
+    EMPTY,
+    WHITE_KING,
+    WHITE_KNIGHT,
+    WHITE_PAWN,
+    WHITE_ROOK,
+)
+from type_defs import MoveType
+from utils import move_piece, notation_to_loc, parse_move, teleport_piece
+from zobrist import compute_hash
+
+
+def test_board_round_trip():
+    test_board = [
+        ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # 8
+        ["♟", "♟", "♟", ".", "♟", "♟", "♟", "♟"],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♟", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", "♙", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        ["♙", "♙", "♙", "♙", ".", "♙", "♙", "♙"],  # 2
+        ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board)
+    assert position.to_board() == test_board
+
+    # occupancy masks agree with the per-piece bitboards
+    assert position.white | position.black == position.occupied
+    assert position.white & position.black == 0
+    assert bin(position.occupied).count("1") == 32
+    assert position.bitboards[BLACK_PAWN] >> loc_to_square(notation_to_loc("d5")) & 1
+    assert position.piece_at(notation_to_loc("e4")) == WHITE_PAWN
+
+
+def test_moves_on_position():
+    test_board = [
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♟", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", "♙", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board)
+    start = notation_to_loc("e4")
+
+    # the same answers come back whether we pass a Board or a Position
+    assert sorted(get_possible_moves(position, start)) == sorted(
+        get_possible_moves(test_board, start)
+    )
+    assert (notation_to_loc("d5"), MoveType.CAPTURE) in get_possible_moves(
+        position, start
+    )
+
+
+def test_make_unmake():
+    start_board = [
+        ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # 8
+        ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],  # 2
+        ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(start_board)
+    original = Position.from_board(start_board)
+
+    # 1. e4 d5 2. exd5 Qxd5 3. Ke2
+    for move in ["e2e4", "d7d5", "e4d5", "d8d5", "e1e2"]:
+        start, end = parse_move(move)
+        move_piece(position, start, end)
+
+    assert position.piece_at(notation_to_loc("d5")) == BLACK_QUEEN
+    assert position.ep_square == -1
+    assert not position.white_to_move
+    assert position.castling == 4 | 8  # white lost both rights with Ke2
+    assert len(position.history) == 5
+
+    # taking everything back restores the captured pieces and the rights
+    while position.history:
+        position.unmake_move()
+    assert position == original
+    assert position.to_board() == start_board
+    assert position.occupied == original.occupied
+
+
+def test_incremental_hash():
+    start_board = [
+        ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # 8
+        ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],  # 2
+        ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    first = Position.from_board(start_board)
+    second = Position.from_board(start_board)
+    initial_hash = first.hash
+
+    # the same position reached through different move orders hashes the same
+    for move in ["g1f3", "g8f6", "b1c3", "b8c6"]:
+        move_piece(first, *parse_move(move))
+        assert first.hash == compute_hash(first)
+    for move in ["b1c3", "b8c6", "g1f3", "g8f6"]:
+        move_piece(second, *parse_move(move))
+    assert first.hash == second.hash
+
+    # side to move, castling rights and en passant all change the key
+    move_piece(first, *parse_move("e2e4"))
+    assert first.hash == compute_hash(first)
+    move_piece(first, *parse_move("h8g8"))
+    assert first.hash == compute_hash(first)
+    teleport_piece(first, *parse_move("a1a3"))
+    assert first.hash == compute_hash(first)
+    teleport_piece(first, *parse_move("a1a3"))
+
+    while first.history:
+        first.unmake_move()
+    assert first.hash == initial_hash
+
+
+def test_teleport_undo():
+    # a teleport goes on the undo stack, so undoing after one swaps back
+    # first, then takes back the moves before it
+    position = Position.from_board(STARTING_BOARD)
+    original = Position.from_board(STARTING_BOARD)
+    move_piece(position, *parse_move("e2e4"))
+    after_e4 = Position.from_board(position.to_board(), False, 15, 44)
+    teleport_piece(position, *parse_move("e4a3"))
+    # the double push is no longer the last move
+    assert position.ep_square == -1
+    assert position.hash == compute_hash(position)
+    position.unmake_move()
+    assert position == after_e4
+    position.unmake_move()
+    assert position == original
+    assert position.bitboards[WHITE_PAWN] == original.bitboards[WHITE_PAWN]
+
+    # castling rights of a king or rook teleported away are dropped, and
+    # come back when the teleport is undone
+    teleport_piece(position, *parse_move("h1h3"))
+    assert position.castling == 14
+    assert position.hash == compute_hash(position)
+    position.unmake_move()
+    assert position == original
+
+
+def test_special_moves():
+    test_board = [
+        ["♜", ".", ".", ".", "♚", ".", ".", "."],  # 8
+        [".", ".", ".", ".", ".", ".", "♙", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♙", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        ["♖", ".", ".", ".", "♔", ".", ".", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board, white_to_move=False)
+    original = Position.from_board(test_board, white_to_move=False)
+    assert position.castling == 1 | 2 | 8  # black has no h8 rook
+
+    # black castles long, white castles short
+    move_piece(position, *parse_move("e8c8"))
+    assert position.piece_at(notation_to_loc("d8")) == BLACK_ROOK
+    move_piece(position, *parse_move("e1g1"))
+    assert position.piece_at(notation_to_loc("f1")) == WHITE_ROOK
+    assert position.castling == 0
+
+    # e7-e5 allows d5xe6 en passant, which removes the pawn on e5
+    position.put_piece(loc_to_square(notation_to_loc("e7")), BLACK_PAWN)
+    snapshot = Position.from_board(position.to_board(), False, 0)
+    move_piece(position, *parse_move("e7e5"))
+    assert position.ep_square == loc_to_square(notation_to_loc("e6"))
+    assert position.make_move(*map(loc_to_square, parse_move("d5e6"))) == BLACK_PAWN
+    assert position.piece_at(notation_to_loc("e5")) == EMPTY
+    assert position.hash == compute_hash(position)
+
+    # g7-g8 promotes, to a queen unless told otherwise
+    move_piece(position, *parse_move("c8b8"))
+    move_piece(position, *parse_move("g7g8"), WHITE_KNIGHT)
+    assert position.piece_at(notation_to_loc("g8")) == WHITE_KNIGHT
+    assert position.hash == compute_hash(position)
+
+    for _ in range(4):
+        position.unmake_move()
+    assert position.to_board() == snapshot.to_board()
+    assert position.hash == compute_hash(position)
+    while position.history:
+        position.unmake_move()
+    assert position.squares[4] == BLACK_KING
+    assert position.squares[60] == WHITE_KING
+    assert position.castling == original.castling
+
+
+def test_targets_of_side_not_to_move():
+    # after 1.e4 the en passant square e3 is black's; asking for a white
+    # pawn's targets (as a move preview does) mustn't try to capture onto it
+    position = Position.from_board(STARTING_BOARD)
+    position.make_move(52, 36)
+    original = Position.from_board(position.to_board(), False, 15, 44)
+    d2 = loc_to_square(notation_to_loc("d2"))
+    assert legal_targets(position, d2, True) == 1 << 43 | 1 << 35  # d3, d4
+    assert position == original
+    assert position.bitboards[EMPTY] == 0
+    assert position.occupied == original.occupied
+    position.make_move(12, 28)
+    assert len(generate_moves(position)) == 29
+
+
+def test_bad_special_moves():
+    # an en passant capture without a pawn behind the square, or castling
+    # without a rook in the corner, is refused before anything changes
+    test_board = [
+        [".", ".", ".", ".", "♚", ".", ".", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♙", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        [".", ".", ".", ".", "♔", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board)
+    original = Position.from_board(test_board)
+    for move in (encode_move(27, 20, EN_PASSANT), encode_move(60, 62, KING_CASTLE)):
+        try:
+            position.make(move)
+        except ValueError:
+            pass
+        else:
+            assert False, move
+        assert position == original and not position.history
+        assert position.occupied == original.occupied
+    try:
+        position.put_piece(0, EMPTY)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_move_encoding():
+    test_board = [
+        ["♞", ".", ".", ".", "♚", ".", ".", "♜"],  # 8
+        [".", ".", ".", ".", ".", ".", "♙", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♙", "♟", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        [".", "♙", ".", ".", ".", ".", ".", "."],  # 2
+        ["♖", ".", ".", ".", "♔", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    e6 = loc_to_square(notation_to_loc("e6"))
+    position = Position.from_board(test_board, ep_square=e6)
+
+    def flags(move: str, promotion: int = EMPTY) -> int:
+        start, end = map(loc_to_square, parse_move(move))
+        packed = position.encode_move(start, end, promotion)
+        assert (move_start(packed), move_end(packed)) == (start, end)
+        return move_flags(packed)
+
+    assert flags("b2b3") == QUIET
+    assert flags("b2b4") == DOUBLE_PUSH
+    assert flags("d5e6") == EN_PASSANT
+    assert flags("e1c1") == QUEEN_CASTLE
+    assert flags("a1a8") == CAPTURE
+    assert flags("g7g8") == QUEEN_PROMOTION
+    assert flags("g7h8", WHITE_KNIGHT) == KNIGHT_PROMOTION | CAPTURE
+    assert is_capture(encode_move(0, 1, EN_PASSANT))
+    assert is_promotion(encode_move(8, 0, ROOK_PROMOTION))
+
+    # the generator's moves are the ones encode_move makes
+    for move in generate_moves(position):
+        start, end = move_start(move), move_end(move)
+        promotion = PROMOTION_PIECES[True][move_flags(move) & 3]
+        assert position.encode_move(start, end, promotion) == move
+        position.make(move)
+        assert position.hash == compute_hash(position)
+        position.unmake_move()
+
+
+test_board_round_trip()
+test_moves_on_position()
+test_make_unmake()
+test_incremental_hash()
+test_teleport_undo()
+test_special_moves()
+test_targets_of_side_not_to_move()
+test_bad_special_moves()
+test_move_encoding()
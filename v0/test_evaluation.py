@@ -0,0 +1,43 @@
+from bitboard import STARTING_BOARD, Position
+from evaluation import MAX_PHASE, compute_scores, evaluate
+from movegen import generate_moves
+from perft import load_position
+
+
+def scores(position: Position) -> tuple[int, int, int]:
+    return position.mg, position.eg, position.phase
+
+
+def test_start_position():
+    position = Position.from_board(STARTING_BOARD)
+    assert scores(position) == (0, 0, MAX_PHASE)
+    assert evaluate(position) == 0
+
+    # the same position is worth the same to whichever side is to move
+    position.make_move(52, 36)  # e2e4
+    white_view = -evaluate(position)
+    assert white_view > 0
+    position.make_move(12, 28)  # e7e5
+    assert evaluate(position) == 0
+
+
+def test_incremental_scores():
+    # every node two plies into positions full of captures, castling, en
+    # passant and promotions agrees with a full recompute, before and after
+    # unmake
+    for name in ("kiwipete", "position3", "position4", "position5"):
+        position = load_position(name)
+        assert scores(position) == compute_scores(position)
+        for move in generate_moves(position):
+            position.make(move)
+            assert scores(position) == compute_scores(position), (name, move)
+            for reply in generate_moves(position):
+                position.make(reply)
+                assert scores(position) == compute_scores(position)
+                position.unmake_move()
+            position.unmake_move()
+            assert scores(position) == compute_scores(position)
+
+
+test_start_position()
+test_incremental_scores()
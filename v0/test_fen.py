@@ -0,0 +1,96 @@
+from bitboard import STARTING_BOARD, Position, loc_to_square
+from evaluation import compute_scores
+from fen import STARTING_FEN, position_from_fen, position_to_fen, sample_fens
+from movegen import generate_moves
+from perft import PERFT_POSITIONS
+from zobrist import compute_hash
+
+
+def test_starting_position():
+    position = position_from_fen(STARTING_FEN)
+    assert position == Position.from_board(STARTING_BOARD)
+    assert position.bitboards == Position.from_board(STARTING_BOARD).bitboards
+    assert (position.halfmove_clock, position.fullmove_number) == (0, 1)
+    assert position_to_fen(position) == STARTING_FEN
+
+
+def test_round_trip():
+    for fen, _ in PERFT_POSITIONS.values():
+        assert position_to_fen(position_from_fen(fen)) == fen
+    # every field of a parsed position matches a full recomputation
+    for fen in sample_fens(500):
+        position = position_from_fen(fen)
+        assert position_to_fen(position) == fen
+        assert position.hash == compute_hash(position)
+        assert (position.mg, position.eg, position.phase) == compute_scores(position)
+        assert position.occupied == position.white | position.black
+
+
+def test_move_counters():
+    position = position_from_fen(STARTING_FEN)
+    for start, end in (((6, 4), (4, 4)), ((0, 6), (2, 5)), ((7, 6), (5, 5))):
+        position.make_move(loc_to_square(start), loc_to_square(end))
+    # the pawn move reset the clock, the two knight moves count
+    assert position_to_fen(position) == (
+        "rnbqkb1r/pppppppp/5n2/8/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 2 2"
+    )
+    position.unmake_move()
+    position.unmake_move()
+    assert position_to_fen(position) == (
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+    )
+
+    # counters may be left off, and castling letters come in any order
+    position = position_from_fen("4k3/8/8/8/8/8/8/R3K2R w QK -")
+    assert position_to_fen(position) == "4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1"
+
+
+def test_impossible_rights():
+    # rights for a king or rook that isn't at home are dropped
+    position = position_from_fen("4k3/8/8/8/8/8/8/4K3 w Kq - 0 1")
+    assert position.castling == 0
+    assert position.hash == compute_hash(position)
+    assert len(generate_moves(position)) == 5
+    position = position_from_fen("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1")
+    assert position_to_fen(position) == "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1"
+    # an en passant square that fits the board is kept
+    fen = "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1"
+    assert position_to_fen(position_from_fen(fen)) == fen
+
+
+def test_invalid_fens():
+    for fen in (
+        "",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+        "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQxq - 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e4 0 1",
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - zero 1",
+        # en passant squares that don't fit the board: on the side to move's
+        # own third rank, without the pushed pawn, or with the square the
+        # pawn came from occupied
+        "4k3/8/8/8/8/8/3P1P2/4K3 w - e3 0 1",
+        "4k3/8/8/3pP3/8/8/8/4K3 w - c6 0 1",
+        "4k3/3p4/8/3pP3/8/8/8/4K3 w - d6 0 1",
+        # pawns on the back ranks, and kings missing, doubled or touching
+        "P6k/8/8/8/8/8/8/K7 w - - 0 1",
+        "k7/8/8/8/8/8/8/K6p b - - 0 1",
+        "8/8/8/8/8/8/8/K7 w - - 0 1",
+        "k6k/8/8/8/8/8/8/K7 w - - 0 1",
+        "8/8/8/8/8/8/8/Kk6 w - - 0 1",
+    ):
+        try:
+            position_from_fen(fen)
+        except ValueError as e:
+            assert str(e).startswith("Invalid FEN"), fen
+        else:
+            assert False, fen
+
+
+test_starting_position()
+test_round_trip()
+test_move_counters()
+test_impossible_rights()
+test_invalid_fens()
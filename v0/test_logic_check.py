@@ -1,10 +1,20 @@
+from attacks import attack_map
+from bitboard import STARTING_BOARD, Position, iter_squares, loc_to_square
+from fen import position_from_fen, sample_fens
 from logic_check import (
+    PreviewCache,
+    as_position,
+    get_possible_moves,
+    get_targets,
     is_valid_bishop_move,
+    is_valid_king_move,
     is_valid_knight_move,
     is_valid_pawn_move,
     is_valid_rook_move,
 )
-from utils import parse_move
+from movegen import generate_moves, is_in_check, legal_targets
+from type_defs import MoveType
+from utils import notation_to_loc, parse_move
 
 
 def test_pawn_moves():
@@ -249,7 +259,207 @@ def test_rook_moves():
     assert not is_valid_rook_move(test_board, start, end, True)  # Diagonal
 
 
+def test_king_moves():
+    # Test board with various scenarios:
+    test_board = [
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", "♟", "♙", ".", ".", "."],  # 5
+        [".", ".", ".", "♔", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        ["♔", ".", ".", ".", ".", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+
+    # White king at d4 can step one square in any direction
+    start, end = parse_move("d4c5")
+    assert is_valid_king_move(test_board, start, end, True)
+    start, end = parse_move("d4d3")
+    assert is_valid_king_move(test_board, start, end, True)
+    start, end = parse_move("d4e3")
+    assert is_valid_king_move(test_board, start, end, True)
+    start, end = parse_move("d4d5")
+    assert is_valid_king_move(test_board, start, end, True)  # Capture black pawn
+
+    # Invalid moves
+    start, end = parse_move("d4e5")
+    assert not is_valid_king_move(test_board, start, end, True)  # Own pawn
+    start, end = parse_move("d4d6")
+    assert not is_valid_king_move(test_board, start, end, True)  # Two squares
+    start, end = parse_move("d4e4")
+    assert not is_valid_king_move(test_board, start, end, True)  # Pawn on d5
+
+    # King in the corner doesn't wrap around the board edge
+    start, end = parse_move("a1b2")
+    assert is_valid_king_move(test_board, start, end, True)
+    start, end = parse_move("a1h2")
+    assert not is_valid_king_move(test_board, start, end, True)
+
+
+def test_check_detection():
+    test_board = [
+        ["♜", ".", ".", ".", ".", ".", "♚", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", "♝", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        ["♜", ".", ".", ".", "♔", ".", ".", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board)
+    attacked = attack_map(position, False)
+
+    def is_attacked(square: str) -> bool:
+        return bool(attacked >> loc_to_square(notation_to_loc(square)) & 1)
+
+    # the rook on a1 gives check, and its ray carries on through the king
+    assert is_in_check(position)
+    assert is_attacked("e1") and is_attacked("f1") and is_attacked("h1")
+    assert not is_attacked("d2")
+    assert is_attacked("e2") and is_attacked("g2")  # bishop on f3
+    assert not is_in_check(position, False)
+
+    # the king can't step back along the checking ray or into the bishop's
+    # diagonals, and can't castle out of check
+    for move, valid in (("e1f1", False), ("e1e2", False), ("e1d2", True)):
+        start, end = parse_move(move)
+        assert is_valid_king_move(position, start, end, True) == valid, move
+    start, end = parse_move("e1g1")
+    assert not is_valid_king_move(position, start, end, True)
+
+
+def test_pins_and_check_evasions():
+    test_board = [
+        [".", ".", ".", ".", "♜", ".", "♚", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", "♝", ".", ".", ".", ".", ".", "."],  # 5
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", "♗", "♘", ".", ".", "."],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        [".", ".", ".", ".", "♔", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+
+    # the knight on e3 is pinned by the rook on e8 and can't move at all
+    start, end = parse_move("e3c4")
+    assert not is_valid_knight_move(test_board, start, end, True)
+    assert get_possible_moves(test_board, start) == []
+
+    # the bishop on b5 lines up with d3 but not with the king on e1,
+    # so the bishop on d3 moves freely
+    start, end = parse_move("d3h7")
+    assert is_valid_bishop_move(test_board, start, end, True)
+
+    test_board = [
+        [".", ".", ".", ".", "♜", ".", "♚", "."],  # 8
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 5
+        ["♗", ".", ".", ".", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "♖"],  # 3
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 2
+        [".", ".", ".", ".", "♔", ".", ".", "."],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+
+    # in check, other pieces may only capture the checker or block it
+    for move, valid in (("h3e3", True), ("h3h4", False)):
+        start, end = parse_move(move)
+        assert is_valid_rook_move(test_board, start, end, True) == valid, move
+    for move, valid in (("a4e8", True), ("a4b3", False)):
+        start, end = parse_move(move)
+        assert is_valid_bishop_move(test_board, start, end, True) == valid, move
+
+    # pins and evasions are worked out once per position, and every piece's
+    # targets are masked with them; they agree with the move generator
+    for fen in sample_fens(200):
+        position = position_from_fen(fen)
+        for square in iter_squares(position.occupied):
+            is_white = bool(position.white >> square & 1)
+            expected = legal_targets(position, square, is_white)
+            assert get_targets(position, square) == expected, (fen, square)
+
+
+def test_preview_cache():
+    position = Position.from_board(STARTING_BOARD)
+    cache = PreviewCache(size=2)
+    e2, g1 = notation_to_loc("e2"), notation_to_loc("g1")
+
+    moves = cache.get_possible_moves(position, e2)
+    assert moves == get_possible_moves(position, e2)
+    assert cache.get_possible_moves(position, e2) is moves
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a move changes the hash, so the same square is looked up afresh
+    position.make_move(loc_to_square(e2), loc_to_square(notation_to_loc("e4")))
+    assert cache.get_possible_moves(position, e2) == []
+    assert (cache.hits, cache.misses) == (1, 2)
+    # and undoing it finds the old entry again
+    position.unmake_move()
+    assert cache.get_possible_moves(position, e2) is moves
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # the least recently used entry is dropped once the cache is full
+    cache.get_possible_moves(position, g1)
+    assert len(cache.entries) == 2
+    position.make_move(loc_to_square(g1), loc_to_square(notation_to_loc("f3")))
+    cache.get_possible_moves(position, e2)
+    assert len(cache.entries) == 2
+    position.unmake_move()
+    cache.get_possible_moves(position, g1)
+    assert cache.hits == 3
+    cache.get_possible_moves(position, e2)
+    assert (cache.hits, cache.misses) == (3, 5)
+    assert cache.hit_rate() == 3 / 8
+
+
+def test_list_boards():
+    # a list board is converted once, and a changed board converted again
+    board = [row[:] for row in STARTING_BOARD]
+    position = as_position(board)
+    assert as_position([row[:] for row in board]) is position
+    e2 = notation_to_loc("e2")
+    assert len(get_possible_moves(board, e2)) == 2
+    board[5][4] = "♞"  # a knight on e3 blocks the pawn
+    assert as_position(board) is not position
+    assert get_possible_moves(board, e2) == []
+
+
+def test_en_passant_preview():
+    # the en passant square made by 1.e4 is only black's to capture onto
+    test_board = [
+        ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],  # 8
+        ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],  # 7
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 6
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 5
+        [".", ".", ".", "♟", ".", ".", ".", "."],  # 4
+        [".", ".", ".", ".", ".", ".", ".", "."],  # 3
+        ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],  # 2
+        ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],  # 1
+    ]  #  a    b    c    d    e    f    g    h
+    position = Position.from_board(test_board)
+    position.make_move(loc_to_square((6, 4)), loc_to_square((4, 4)))
+    snapshot = position.to_board()
+    for square in ("d2", "f2"):
+        moves = get_possible_moves(position, notation_to_loc(square))
+        assert all(move_type != MoveType.EN_PASSANT for _, move_type in moves)
+    assert (notation_to_loc("e3"), MoveType.EN_PASSANT) in get_possible_moves(
+        position, notation_to_loc("d4")
+    )
+    # previewing the side not to move leaves the position alone
+    assert position.to_board() == snapshot
+    assert position.white | position.black == position.occupied
+    assert len(generate_moves(position)) == 22  # 20, d3 and dxe3
+
+
 test_pawn_moves()
 test_knight_moves()
 test_bishop_moves()
 test_rook_moves()
+test_king_moves()
+test_check_detection()
+test_pins_and_check_evasions()
+test_preview_cache()
+test_list_boards()
+test_en_passant_preview()
@@ -0,0 +1,61 @@
+from fen import position_from_fen, sample_fens
+from movegen import generate_moves, has_legal_move, reference_moves
+from perft import PERFT_POSITIONS, divide, load_position, perft
+
+
+def test_perft_positions():
+    # shallow depths of every standard position; `python perft.py --depth 4`
+    # checks the deeper counts
+    for name, (*_, expected) in PERFT_POSITIONS.items():
+        position = load_position(name)
+        for depth in (1, 2):
+            assert perft(position, depth) == expected[depth - 1], (name, depth)
+        # perft leaves the position as it found it
+        assert position == load_position(name)
+
+
+def test_divide():
+    counts = divide(load_position("startpos"), 2)
+    assert len(counts) == 20
+    assert counts["e2e4"] == 20
+    assert sum(counts.values()) == 400
+
+    # promotions are listed once per piece
+    counts = divide(load_position("position5"), 1)
+    assert "d7c8q" in counts and "d7c8n" in counts
+
+
+def test_reference_moves():
+    # the slow, independent move list the validators check against also
+    # has to get the published counts
+    def reference_perft(position, depth):
+        if depth == 0:
+            return 1
+        nodes = 0
+        for move in reference_moves(position):
+            position.make(move)
+            nodes += reference_perft(position, depth - 1)
+            position.unmake_move()
+        return nodes
+
+    for name, (_, expected) in PERFT_POSITIONS.items():
+        assert reference_perft(load_position(name), 2) == expected[1], name
+
+
+def test_has_legal_move():
+    for fen in sample_fens(300):
+        position = position_from_fen(fen)
+        assert has_legal_move(position) == bool(generate_moves(position)), fen
+    for fen, expected in (
+        # checkmate, stalemate, and a king boxed in by its own pieces
+        ("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3", False),
+        ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", False),
+        ("6rk/6pp/8/8/8/8/8/K7 b - - 0 1", True),
+    ):
+        assert has_legal_move(position_from_fen(fen)) == expected, fen
+
+
+test_perft_positions()
+test_divide()
+test_reference_moves()
+test_has_legal_move()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+from fen import STARTING_FEN, position_from_fen, position_to_fen
+from movegen import generate_moves
+from pgn import (
+    iter_sans,
+    move_to_san,
+    parse_games,
+    random_games,
+    read_games,
+    replay_game,
+    resolve_san,
+)
+
+ARCHIVE = b"""[Event "First"]
+[White "A \\"quoted\\" name"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {the usual; or is it} Nc6 (2... d6 3. d4 (3. Bc4)) 3. Bb5 $1
+a6 4. Ba4 Nf6 5. O-O Be7 6. Re1 b5 7. Bb3 d6 8. c3 O-O 1-0
+
+[Event "Second"]
+[SetUp "1"]
+[FEN "4k3/1P6/8/3pP3/8/8/8/4K2R w K d6 0 1"]
+
+1. exd6 Kd7 2. b8=N Kxd6 3. O-O *
+% a line for another program
+
+[Event "Third"]
+
+1. e4 e5 2. Ke2 Ke7 3. Nc3 Nc6 4. Nd5+ Nd4+ 5. Kd3 1/2-1/2
+"""
+
+
+def test_parse_games():
+    games = list(parse_games(ARCHIVE.splitlines(keepends=True)))
+    assert [game.tags["Event"] for game in games] == ["First", "Second", "Third"]
+    assert games[0].tags["White"] == 'A "quoted" name'
+    assert games[1].offset == ARCHIVE.index(b'[Event "Second"]')
+    # comments, NAGs, variations and move numbers are skipped
+    assert list(iter_sans(games[0].movetext))[:6] == [
+        "e4",
+        "e5",
+        "Nf3",
+        "Nc6",
+        "Bb5",
+        "a6",
+    ]
+
+    # read from a file, the games come out the same
+    with tempfile.NamedTemporaryFile(suffix=".pgn", delete=False) as f:
+        f.write(ARCHIVE)
+    try:
+        assert list(read_games(f.name)) == games
+    finally:
+        os.remove(f.name)
+
+
+def test_replay():
+    first, second, third = parse_games(ARCHIVE.splitlines(keepends=True))
+    assert replay_game(first) == (16, None)
+    # en passant, promotion and castling from a FEN start
+    assert replay_game(second, check=True) == (5, None)
+    # the first illegal move (ignoring the check) is reported, and nothing
+    # after it is played
+    assert replay_game(third) == (7, "ply 8: Illegal move: Nd4+")
+
+
+def test_resolve_san():
+    position = position_from_fen("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1")
+    try:
+        resolve_san(position, "Nd2")
+    except ValueError as e:
+        assert str(e) == "Ambiguous move: Nd2"
+    else:
+        assert False
+    position.make(resolve_san(position, "Nbd2"))
+    assert position_to_fen(position) == "4k3/8/8/8/8/8/3N4/4KN2 b - - 1 1"
+    for san in ("Kd9", "Qe2", "O-O", "e4"):
+        try:
+            resolve_san(position, san)
+        except ValueError:
+            pass
+        else:
+            assert False, san
+
+
+def test_san_round_trip():
+    # every move of random games survives being written out as SAN and
+    # read back in
+    for pgn in random_games(20):
+        game = next(parse_games(pgn.encode().splitlines(keepends=True)))
+        assert replay_game(game, check=True).error is None
+    position = position_from_fen(STARTING_FEN)
+    for move in generate_moves(position):
+        assert resolve_san(position, move_to_san(position, move)) == move
+
+
+test_parse_games()
+test_replay()
+test_resolve_san()
+test_san_round_trip()
@@ -0,0 +1,45 @@
+import io
+
+from bitboard import STARTING_BOARD, Position
+from render import CLEAR_SCREEN_END, HOME_AND_CLEAR, Renderer, move_to
+from utils import format_board
+
+
+def test_renderer_redraws_changed_lines():
+    out = io.StringIO()
+    renderer = Renderer(out)
+    position = Position.from_board(STARTING_BOARD)
+    first = format_board(position.to_board()) + ["", "Current turn: White"]
+
+    # the first frame clears the screen and draws everything
+    renderer.draw(first)
+    assert out.getvalue().startswith(HOME_AND_CLEAR)
+    assert all(line in out.getvalue() for line in first)
+
+    # after e2e4 only ranks 4 and 2 and the turn line are rewritten
+    out.seek(0)
+    out.truncate()
+    position.make_move(52, 36)
+    second = format_board(position.to_board()) + ["", "Current turn: Black"]
+    renderer.draw(second)
+    written = out.getvalue()
+    assert HOME_AND_CLEAR not in written
+    changed = [row for row in range(len(second)) if move_to(row) in written]
+    assert changed == [5, 7, 11]
+    assert second[5] in written and second[1] not in written
+    # the cursor ends up below the frame with the rest of the screen erased
+    assert written.endswith(move_to(len(second)) + CLEAR_SCREEN_END)
+
+    # an unchanged frame only moves the cursor back under it
+    out.seek(0)
+    out.truncate()
+    renderer.draw(second)
+    assert out.getvalue() == move_to(len(second)) + CLEAR_SCREEN_END
+
+    # after invalidate the whole frame is drawn again
+    renderer.invalidate()
+    renderer.draw(second)
+    assert HOME_AND_CLEAR in out.getvalue()
+
+
+test_renderer_redraws_changed_lines()
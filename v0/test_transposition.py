@@ -0,0 +1,82 @@
+from transposition import (
+    ALWAYS_REPLACE,
+    BUCKET_SIZE,
+    ENTRY_WORDS,
+    EXACT,
+    LOWER,
+    UPPER,
+    SharedTranspositionTable,
+    TranspositionTable,
+)
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    assert table.megabytes == 1
+
+    table.store(0xDEADBEEF, 4, -250, LOWER, 1234)
+    assert table.probe(0xDEADBEEF) == (4, -250, LOWER, 1234)
+    assert table.probe(0xBEEF) is None  # never stored
+
+    # a shallower result for the same position doesn't overwrite a deeper one
+    table.store(0xDEADBEEF, 2, 100, UPPER, 99)
+    assert table.probe(0xDEADBEEF) == (4, -250, LOWER, 1234)
+
+    # an all-zero result is still a real entry
+    table.store(0xF00D, 0, 0, EXACT, 0)
+    assert table.probe(0xF00D) == (0, 0, EXACT, 0)
+
+    assert table.hit_rate() == 3 / 4
+    assert table.used == 2
+
+
+def test_replacement_policies():
+    # keys that differ only above the index bits all land in bucket 0
+    def key(n):
+        return (n + 1) << 40
+
+    depth_preferred = TranspositionTable(0.001)
+    always = TranspositionTable(0.001, ALWAYS_REPLACE)
+    for table in (depth_preferred, always):
+        for n in range(BUCKET_SIZE):
+            table.store(key(n), 8, n, EXACT)
+        assert table.fill() > 0
+        table.store(key(BUCKET_SIZE), 1, 0, EXACT)
+
+    # the shallow result is dropped by depth-preferred, kept by always-replace
+    assert depth_preferred.probe(key(BUCKET_SIZE)) is None
+    assert always.probe(key(BUCKET_SIZE)) == (1, 0, EXACT, 0)
+    assert always.collisions == 1
+
+    # after a new search, old entries are fair game for any depth
+    depth_preferred.new_search()
+    depth_preferred.store(key(BUCKET_SIZE), 1, 0, EXACT)
+    assert depth_preferred.probe(key(BUCKET_SIZE)) == (1, 0, EXACT, 0)
+
+
+def test_shared_table():
+    owner = SharedTranspositionTable(1)
+    other = SharedTranspositionTable(1, name=owner.name)
+    try:
+        # both handles see the same entries
+        owner.store(0xDEADBEEF, 4, -250, LOWER, 1234)
+        assert other.probe(0xDEADBEEF) == (4, -250, LOWER, 1234)
+        other.store(0xF00D, 3, 7, EXACT)
+        assert owner.probe(0xF00D) == (3, 7, EXACT, 0)
+
+        # an entry whose words don't agree, as left by two processes writing
+        # at once, is a miss rather than a wrong answer
+        index = (0xF00D & owner.bucket_mask) * BUCKET_SIZE * ENTRY_WORDS
+        owner.table[index + 1] ^= 1 << 20
+        assert other.probe(0xF00D) is None
+
+        owner.clear()
+        assert other.probe(0xDEADBEEF) is None
+    finally:
+        other.close()
+        owner.close()
+
+
+test_store_and_probe()
+test_replacement_policies()
+test_shared_table()
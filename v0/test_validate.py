@@ -0,0 +1,110 @@
+import os
+import tempfile
+
+import movegen
+import validate
+from fen import STARTING_FEN, sample_fens
+from pgn import random_games
+from validate import (
+    Shard,
+    Stats,
+    validate_archives,
+    validate_files,
+    validate_position,
+    validate_shard,
+)
+
+ILLEGAL_GAME = '[Event "Illegal"]\n\n1. e4 e5 2. Bb6 *\n\n'
+
+
+def _write_archives(directory: str) -> None:
+    with open(os.path.join(directory, "games.pgn"), "w") as f:
+        f.write("".join(random_games(10)) + ILLEGAL_GAME)
+    os.mkdir(os.path.join(directory, "more"))
+    with open(os.path.join(directory, "more", "positions.fen"), "w") as f:
+        f.write("\n".join(sample_fens(50)) + "\nnot a fen\n")
+    with open(os.path.join(directory, "notes.txt"), "w") as f:
+        f.write("skipped\n")
+
+
+def test_validate_files():
+    with tempfile.TemporaryDirectory() as directory:
+        _write_archives(directory)
+        whole = dict(validate_files([directory], workers=1, shard_size=1 << 20))
+        assert sorted(os.path.relpath(path, directory) for path in whole) == [
+            "games.pgn",
+            os.path.join("more", "positions.fen"),
+        ]
+        games = whole[os.path.join(directory, "games.pgn")]
+        assert (games.games, games.illegal) == (11, 1)
+        assert games.errors[0].endswith("ply 3: Illegal move: Bb6")
+        positions = whole[os.path.join(directory, "more", "positions.fen")]
+        assert (positions.games, positions.illegal) == (51, 1)
+
+        # cut into small shards, every game is still validated exactly once
+        shards = []
+        split = dict(
+            validate_files(
+                [directory],
+                workers=2,
+                shard_size=500,
+                in_flight=1,
+                on_shard=lambda shard, stats: shards.append(shard),
+            )
+        )
+        assert len(shards) > 10
+        for path, stats in whole.items():
+            assert stats[:3] == split[path][:3]
+
+        # a missing file is reported, and the others are still validated
+        missing = os.path.join(directory, "missing.pgn")
+        results = dict(validate_files([missing, directory], workers=2))
+        assert results[missing][:3] == (0, 0, 0)
+        assert "No such file" in results[missing].errors[0]
+        assert results[os.path.join(directory, "games.pgn")][:3] == games[:3]
+
+        # stopping early doesn't hang the pool
+        for _ in validate_archives([directory], workers=2, shard_size=500):
+            break
+
+
+def test_validate_position():
+    assert validate_position("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1") == (26, None)
+    checked, error = validate_position("4k3/8/8/8/8/8/8/R3K2R w KQ")
+    assert checked == 0 and error.startswith("Invalid FEN")
+    # a move generator that loses a move is caught
+    generate_moves = movegen.generate_moves
+    movegen.generate_moves = lambda position: generate_moves(position)[1:]
+    try:
+        assert validate_position(STARTING_FEN) == (0, "move generator misses a2a3")
+    finally:
+        movegen.generate_moves = generate_moves
+
+    total = Stats(1, 2, 0, 0.5, ("a",)).merge(Stats(3, 4, 1, 0.5, ("b",)))
+    assert total == Stats(4, 6, 1, 1.0, ("a", "b"))
+
+
+def test_crashing_record():
+    # a record that makes the rules raise is counted as illegal, and the
+    # rest of the shard is still validated
+    def crash(fen):
+        if fen == "crash":
+            raise IndexError("list index out of range")
+        return validate_position(fen)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "positions.fen")
+        with open(path, "w") as f:
+            f.write(f"{STARTING_FEN}\ncrash\n{STARTING_FEN}\n")
+        validate.validate_position = crash
+        try:
+            _, stats = validate_shard(Shard(path, 0, os.path.getsize(path), 1))
+        finally:
+            validate.validate_position = validate_position
+    assert stats[:3] == (3, 40, 1)
+    assert stats.errors[0].endswith(": IndexError: list index out of range")
+
+
+test_validate_files()
+test_validate_position()
+test_crashing_record()
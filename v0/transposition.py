@@ -0,0 +1,229 @@
+from array import array
+from multiprocessing import shared_memory
+
+# bound types
+EXACT = 0
+LOWER = 1  # score is at least this (fail high)
+UPPER = 2  # score is at most this (fail low)
+
+# replacement policies
+DEPTH_PREFERRED = "depth"
+ALWAYS_REPLACE = "always"
+
+BUCKET_SIZE = 4  # entries per bucket
+ENTRY_WORDS = 2  # 64-bit words per entry: key ^ data, data
+ENTRY_BYTES = ENTRY_WORDS * 8
+
+# layout of the data word, lowest bits first
+#   move   16 bits
+#   score  16 bits (two's complement)
+#   depth   8 bits
+#   bound   2 bits
+#   age     6 bits
+#   valid   1 bit, so an all-zero entry is always an empty slot
+_MOVE_MASK = 0xFFFF
+_SCORE_SHIFT = 16
+_DEPTH_SHIFT = 32
+_BOUND_SHIFT = 40
+_AGE_SHIFT = 42
+_AGE_MASK = 0x3F
+_VALID = 1 << 48
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by Zobrist hash.
+
+    Entries live in one preallocated array of 64-bit words, grouped into
+    buckets of BUCKET_SIZE entries. The table never grows: when a bucket is
+    full an entry is evicted according to the replacement policy, so the
+    memory used is exactly what was asked for.
+
+    The first word of an entry holds the key XORed with the data word. An
+    entry only matches when both words agree, so when several processes
+    share the table (SharedTranspositionTable) an entry torn by two
+    simultaneous writes reads as a miss instead of a wrong result, without
+    any locking.
+    """
+
+    def __init__(
+        self, megabytes: float = 16, replacement: str = DEPTH_PREFERRED
+    ) -> None:
+        if replacement not in (DEPTH_PREFERRED, ALWAYS_REPLACE):
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+
+        # round the bucket count down to a power of two so the index is a mask
+        buckets = int(megabytes * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SIZE)
+        buckets = max(1, buckets)
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.bucket_mask = buckets - 1
+        self.capacity = buckets * BUCKET_SIZE
+        self.replacement = replacement
+        self.table = self._allocate()
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+        self.used = 0
+
+    @property
+    def megabytes(self) -> float:
+        return self.capacity * ENTRY_BYTES / (1024 * 1024)
+
+    def new_search(self) -> None:
+        # entries from earlier searches become the first to be replaced
+        self.age = (self.age + 1) & _AGE_MASK
+
+    def _allocate(self):
+        return array("Q", bytes(self.capacity * ENTRY_BYTES))
+
+    def clear(self) -> None:
+        # zeroed in place, other processes may be looking at the same memory
+        self.table[:] = array("Q", bytes(self.capacity * ENTRY_BYTES))
+        self.age = 0
+        self.probes = self.hits = self.stores = self.collisions = self.used = 0
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        """Return (depth, score, bound, move) stored for key, or None."""
+        self.probes += 1
+        table = self.table
+        start = (key & self.bucket_mask) * BUCKET_SIZE * ENTRY_WORDS
+        for index in range(start, start + BUCKET_SIZE * ENTRY_WORDS, ENTRY_WORDS):
+            data = table[index + 1]
+            if data and table[index] ^ data == key:
+                self.hits += 1
+                score = (data >> _SCORE_SHIFT) & 0xFFFF
+                if score >= 0x8000:
+                    score -= 0x10000
+                return (
+                    (data >> _DEPTH_SHIFT) & 0xFF,
+                    score,
+                    (data >> _BOUND_SHIFT) & 3,
+                    data & _MOVE_MASK,
+                )
+        return None
+
+    def store(
+        self, key: int, depth: int, score: int, bound: int, move: int = 0
+    ) -> None:
+        self.stores += 1
+        table = self.table
+        start = (key & self.bucket_mask) * BUCKET_SIZE * ENTRY_WORDS
+        data = (
+            (move & _MOVE_MASK)
+            | ((score & 0xFFFF) << _SCORE_SHIFT)
+            | (min(depth, 0xFF) << _DEPTH_SHIFT)
+            | (bound << _BOUND_SHIFT)
+            | (self.age << _AGE_SHIFT)
+            | _VALID
+        )
+
+        victim = -1
+        victim_worth = 1 << 16
+        for index in range(start, start + BUCKET_SIZE * ENTRY_WORDS, ENTRY_WORDS):
+            old = table[index + 1]
+            if not old:
+                # empty slot, nothing to evict
+                table[index] = key ^ data
+                table[index + 1] = data
+                self.used += 1
+                return
+            if table[index] ^ old == key:
+                # same position: keep the deeper result unless it's stale
+                old_depth = (old >> _DEPTH_SHIFT) & 0xFF
+                if (
+                    self.replacement == ALWAYS_REPLACE
+                    or depth >= old_depth
+                    or bound == EXACT
+                    or (old >> _AGE_SHIFT) & _AGE_MASK != self.age
+                ):
+                    if not move:
+                        data |= old & _MOVE_MASK  # keep the known best move
+                    table[index] = key ^ data
+                    table[index + 1] = data
+                return
+            # entries from older searches are worth less than current ones
+            worth = (old >> _DEPTH_SHIFT) & 0xFF
+            if (old >> _AGE_SHIFT) & _AGE_MASK == self.age:
+                worth += 0x100
+            if worth < victim_worth:
+                victim = index
+                victim_worth = worth
+
+        if self.replacement == DEPTH_PREFERRED and victim_worth > 0x100 + depth:
+            return  # every entry in the bucket is deeper and current
+        self.collisions += 1
+        table[victim] = key ^ data
+        table[victim + 1] = data
+
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    def collision_rate(self) -> float:
+        return self.collisions / self.stores if self.stores else 0.0
+
+    def fill(self) -> float:
+        return self.used / self.capacity
+
+    def stats(self) -> str:
+        return (
+            f"hash {self.megabytes:g}MB ({self.replacement}): "
+            f"hits {self.hit_rate():.1%} of {self.probes} probes, "
+            f"collisions {self.collision_rate():.1%} of {self.stores} stores, "
+            f"fill {self.fill():.1%}"
+        )
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A TranspositionTable whose entries live in shared memory.
+
+    The process that creates the table (name=None) owns the memory block;
+    other processes attach to it by passing its name. Lookup statistics are
+    counted per process.
+    """
+
+    def __init__(
+        self,
+        megabytes: float = 16,
+        replacement: str = DEPTH_PREFERRED,
+        name: str | None = None,
+    ) -> None:
+        self.name = name
+        self.owner = name is None
+        super().__init__(megabytes, replacement)
+
+    def _allocate(self):
+        size = self.capacity * ENTRY_BYTES
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.name = self.memory.name
+        else:
+            self.memory = shared_memory.SharedMemory(self.name)
+        # a fresh block is zero filled, so every slot starts out empty
+        return self.memory.buf[:size].cast("Q")
+
+    def close(self) -> None:
+        self.table.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def add_hash_arguments(parser) -> None:
+    parser.add_argument(
+        "--hash",
+        type=float,
+        default=16,
+        metavar="MB",
+        help="transposition table size in megabytes (default: 16)",
+    )
+    parser.add_argument(
+        "--hash-replace",
+        choices=(DEPTH_PREFERRED, ALWAYS_REPLACE),
+        default=DEPTH_PREFERRED,
+        help="transposition table replacement policy (default: depth)",
+    )
+
+
+def table_from_args(args) -> TranspositionTable:
+    return TranspositionTable(args.hash, args.hash_replace)
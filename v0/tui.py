@@ -1,11 +1,29 @@
+from rich.segment import Segment
 from textual.app import App, ComposeResult
-from textual.containers import Horizontal, Vertical, ScrollableContainer
+from textual.containers import Horizontal, Vertical
+from textual.geometry import Size
 from textual.message import Message
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
 from textual.widgets import Header, Static
-from textual import events
-
-from type_defs import BoardLoc, Move, MoveType, Board
-from logic_check import get_possible_moves
+from textual import events, work
+
+import argparse
+
+from bitboard import Position
+from engine import (
+    BackgroundEngine,
+    SearchResult,
+    add_engine_arguments,
+    move_to_notation,
+    search_depth,
+)
+from fen import STARTING_FEN, position_from_fen
+from type_defs import BoardLoc, Move, MoveType
+from logic_check import PreviewCache
+from movegen import has_legal_move, is_in_check
+from pieces import EMPTY, GLYPHS
+from utils import move_piece
 
 
 class ChessSquare(Static):
@@ -81,24 +99,24 @@ class ChessBoard(Static):
             }
         """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, fen: str = STARTING_FEN, **kwargs):
         super().__init__(*args, **kwargs)
         self.selected_pos: BoardLoc | None = None
         self.possible_moves: list[Move] = []
-        self.board = [
-            ["♜", "♞", "♝", "♛", "♚", "♝", "♞", "♜"],
-            ["♟", "♟", "♟", "♟", "♟", "♟", "♟", "♟"],
-            [".", ".", ".", ".", ".", ".", ".", "."],
-            [".", ".", ".", ".", ".", ".", ".", "."],
-            [".", ".", ".", ".", ".", ".", ".", "."],
-            [".", ".", ".", ".", ".", ".", ".", "."],
-            ["♙", "♙", "♙", "♙", "♙", "♙", "♙", "♙"],
-            ["♖", "♘", "♗", "♕", "♔", "♗", "♘", "♖"],
-        ]
+        self.position = position_from_fen(fen)
+        # move lists of the squares looked at, so moving the cursor back and
+        # forth over an unchanged board doesn't regenerate them
+        self.preview = PreviewCache()
+        # the square widgets by [row][column], filled in by compose
+        self.squares: list[list[ChessSquare]] = [[] for _ in range(8)]
+        # highlight class currently shown on each highlighted square
+        self.highlighted: dict[BoardLoc, str] = {}
 
     def compose(self) -> ComposeResult:
         # Generate all widgets first
         widgets = []
+        self.squares = [[] for _ in range(8)]
+        self.highlighted = {}
 
         # Top row (files a-h)
         widgets.append(Static(" ", classes="label"))
@@ -111,10 +129,12 @@ class ChessBoard(Static):
             widgets.append(Static(str(8 - rank), classes="label"))
             for file in range(8):
                 is_light = (rank + file) % 2 == 0
-                piece = self.board[rank][file]
-                widgets.append(
-                    ChessSquare(piece if piece != "." else " ", is_light, (rank, file))
+                piece = self.position.piece_at((rank, file))
+                square = ChessSquare(
+                    GLYPHS[piece] if piece != EMPTY else " ", is_light, (rank, file)
                 )
+                self.squares[rank].append(square)
+                widgets.append(square)
             widgets.append(Static(str(8 - rank), classes="label"))
 
         # Bottom row (files a-h again)
@@ -135,39 +155,95 @@ class ChessBoard(Static):
             self.possible_moves = []
         else:
             self.selected_pos = message.location
-            self.possible_moves = get_possible_moves(self.board, message.location)
+            self.possible_moves = self.preview.get_possible_moves(
+                self.position, message.location
+            )
+        self.refresh_highlights()
+
+    def play_move(
+        self, start: BoardLoc, end: BoardLoc, promotion: int = EMPTY
+    ) -> None:
+        """Apply a move to the position and redraw the squares it touched"""
+        before = self.position.squares.copy()
+        move_piece(self.position, start, end, promotion)
+        # castling and en passant also touch squares besides start and end
+        for square, piece in enumerate(self.position.squares):
+            if piece != before[square]:
+                y, x = divmod(square, 8)
+                self.squares[y][x].update(GLYPHS[piece] if piece != EMPTY else " ")
+        self.selected_pos = None
+        self.possible_moves = []
         self.refresh_highlights()
 
     def refresh_highlights(self) -> None:
-        """Update the visual state of all squares"""
-        for y in range(8):
-            for x in range(8):
-                square = self._get_square_at((y, x))
-                if square:
-                    # Clear existing state classes
-                    square.remove_class("selected")
-                    square.remove_class("possible-move")
-                    square.remove_class("possible-capture")
-
-                    if (y, x) == self.selected_pos:
-                        square.add_class("selected")
-
-                    for move, move_type in self.possible_moves:
-                        if (y, x) == move:
-                            if move_type == MoveType.CAPTURE:
-                                square.add_class("possible-capture")
-                            else:
-                                square.add_class("possible-move")
-
-    def _get_square_at(self, location: BoardLoc) -> ChessSquare | None:
+        """Update the highlighted squares, touching only the ones that change"""
+        wanted: dict[BoardLoc, str] = {}
+        for move, move_type in self.possible_moves:
+            if move_type in (MoveType.CAPTURE, MoveType.EN_PASSANT):
+                wanted[move] = "possible-capture"
+            else:
+                wanted[move] = "possible-move"
+        if self.selected_pos is not None:
+            wanted[self.selected_pos] = "selected"
+
+        for location, highlight in self.highlighted.items():
+            if wanted.get(location) != highlight:
+                self._get_square_at(location).remove_class(highlight)
+        for location, highlight in wanted.items():
+            if self.highlighted.get(location) != highlight:
+                self._get_square_at(location).add_class(highlight)
+        self.highlighted = wanted
+
+    def _get_square_at(self, location: BoardLoc) -> ChessSquare:
         """Get the ChessSquare widget at a given location"""
-        try:
-            widget = list(self.query(ChessSquare).results())[
-                location[0] * 8 + location[1]
-            ]
-            return widget
-        except IndexError:
-            return None
+        return self.squares[location[0]][location[1]]
+
+
+class MoveList(ScrollView):
+    """Numbered move pairs, drawn line by line.
+
+    Only the rows that are scrolled into view are ever rendered, and adding
+    a move redraws just the row it lands on, so the cost of a move doesn't
+    grow with the length of the game.
+    """
+
+    DEFAULT_CSS = """
+        MoveList {
+            height: 90%;
+            margin-top: 1;
+        }
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.moves: list[tuple[str, str]] = []  # (white_move, black_move)
+
+    def add_move(self, move: str, is_white: bool) -> None:
+        if is_white or not self.moves:
+            # a new row, with an empty white move if black moved first
+            self.moves.append((move, "") if is_white else ("", move))
+            row_width = len(self._row_text(len(self.moves) - 1))
+            width = max(self.virtual_size.width, row_width)
+            self.virtual_size = Size(width, len(self.moves))
+            self.scroll_end(animate=False)
+        else:
+            self.moves[-1] = (self.moves[-1][0], move)
+        self.refresh_line(len(self.moves) - 1)
+
+    def _row_text(self, row: int) -> str:
+        white_move, black_move = self.moves[row]
+        return f"{row + 1}. {white_move:<8} {black_move}"
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = self.size.width
+        if row >= len(self.moves):
+            return Strip.blank(width, self.rich_style)
+        strip = Strip([Segment(self._row_text(row), self.rich_style)])
+        return strip.crop(scroll_x, scroll_x + width).extend_cell_length(
+            width, self.rich_style
+        )
 
 
 class MoveHistory(Static):
@@ -183,48 +259,14 @@ class MoveHistory(Static):
         .title {
             text-style: bold;
         }
-
-        .moves-container {
-            height: 90%;
-            margin-top: 1;
-        }
     """
 
-    def __init__(self, id: str):
-        super().__init__(id)
-        self.moves: list[tuple[str, str]] = []  # (white_move, black_move)
-        # Add some test moves
-        # for i in range(50):
-        #     self.moves.append(("e2e4", "e7e5"))
-
     def compose(self) -> ComposeResult:
         yield Static("Move History", classes="title")
-        with ScrollableContainer(classes="moves-container"):
-            # Example moves for testing
-            for i, move in enumerate(self.moves):
-                yield Static(
-                    f"{i + 1}. {move[0]:<8} {move[1]}",
-                    classes="move-row",
-                )
+        yield MoveList()
 
     def add_move(self, move: str, is_white: bool) -> None:
-        if is_white:
-            self.moves.append((move, ""))
-        else:
-            if not self.moves:
-                self.moves.append(("", move))
-            else:
-                temp = (self.moves[-1][0], move)
-                self.moves[-1] = temp
-        self.refresh_moves()
-
-    def refresh_moves(self) -> None:
-        scroll_container = self.query_one(ScrollableContainer)
-        scroll_container.remove_children()
-
-        for i, (white_move, black_move) in enumerate(self.moves, 1):
-            move_text = f"{i}. {white_move:<8} {black_move}"
-            scroll_container.mount(Static(move_text, classes="move-row"))
+        self.query_one(MoveList).add_move(move, is_white)
 
 
 class GameInfo(Static):
@@ -251,11 +293,12 @@ class GameInfo(Static):
         with Vertical(classes="info-container"):
             yield Static("Selected: None", id="selected-piece")
             yield Static("", id="possible-moves")
+            yield Static("", id="engine-info")
 
     def update_info(
         self,
         selected_pos: BoardLoc | None,
-        board: Board,
+        position: Position,
         possible_moves: list[Move],
     ) -> None:
         """Update game info based on board state"""
@@ -267,7 +310,7 @@ class GameInfo(Static):
             moves.update("")
         else:
             y, x = selected_pos
-            piece = board[y][x]
+            piece = GLYPHS[position.piece_at(selected_pos)]
             selected.update(f"Selected: {piece} at {chr(x + 97)}{8 - y}")
 
             # Show possible moves in algebraic notation
@@ -278,6 +321,21 @@ class GameInfo(Static):
                 moves_text += f"• {notation} ({move_type.value})\n"
             moves.update(moves_text)
 
+    def update_search(self, result: SearchResult | None, thinking: bool) -> None:
+        """Show the engine's latest search report"""
+        info = self.query_one("#engine-info", Static)
+        if result is None:
+            info.update("\nEngine: thinking..." if thinking else "")
+            return
+        pv = " ".join(move_to_notation(move) for move in result.pv)
+        nps = result.nodes / result.seconds if result.seconds else 0
+        info.update(
+            f"\nEngine{' (thinking)' if thinking else ''}: "
+            f"depth {result.depth} score {result.score}\n"
+            f"nodes {result.nodes} ({nps:.0f}/s)\n"
+            f"pv {pv}"
+        )
+
 
 class CommandBar(Static):
     """Command input bar."""
@@ -343,10 +401,33 @@ class Tanuki(App):
     }
     """
 
+    def __init__(
+        self,
+        engine: BackgroundEngine | None = None,
+        depth: int = 3,
+        movetime_ms: float | None = None,
+        clock_ms: float | None = None,
+        increment_ms: float = 0,
+        fen: str = STARTING_FEN,
+    ):
+        super().__init__()
+        # searches run in the engine's own process, so the UI stays
+        # responsive while it thinks. Without one given, the app starts its
+        # own on the first engine move and closes it when it's done
+        self.engine = engine
+        self.owns_engine = engine is None
+        self.thinking = False
+        self.cancelled = False
+        self.depth = depth
+        self.movetime_ms = movetime_ms
+        self.clock_ms = clock_ms
+        self.increment_ms = increment_ms
+        self.fen = fen
+
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
         yield Header()
-        yield ChessBoard(id="board-area")
+        yield ChessBoard(id="board-area", fen=self.fen)
 
         with Horizontal(id="side-panel"):
             with Vertical(id="side-content"):
@@ -356,21 +437,118 @@ class Tanuki(App):
 
     def on_chess_square_selected(self, message: ChessSquare.Selected) -> None:
         """Update game info when a square is selected"""
+        self.cancel_search()
+        board = self.query_one(ChessBoard)
+        game_info = self.query_one(GameInfo)
+        game_info.update_info(board.selected_pos, board.position, board.possible_moves)
+
+    def engine_move(self) -> None:
+        """Let the engine start thinking about the side to move"""
+        if self.thinking or self.game_over():
+            return
         board = self.query_one(ChessBoard)
+        if self.engine is None:
+            self.engine = BackgroundEngine()
+        self.thinking = True
+        self.cancelled = False
+        self.engine.start(
+            board.position,
+            self.depth,
+            self.movetime_ms,
+            self.clock_ms,
+            self.increment_ms,
+        )
+        self.sub_title = "Engine thinking..."
+        self.query_one(GameInfo).update_search(None, True)
+        self.wait_for_engine()
+
+    @work(thread=True)
+    def wait_for_engine(self) -> None:
+        # Worker thread: the search runs in the engine's process, this only
+        # waits for its reports and hands them to the event loop
+        for final, result in self.engine.results():
+            if final:
+                self.call_from_thread(self.finish_engine_move, result)
+            else:
+                self.call_from_thread(self.show_search, result)
+
+    def show_search(self, result: SearchResult) -> None:
+        if not self.cancelled:
+            self.query_one(GameInfo).update_search(result, True)
+
+    def finish_engine_move(self, result: SearchResult) -> None:
+        """Play the move the engine settled on, unless it was cancelled"""
+        self.thinking = False
         game_info = self.query_one(GameInfo)
-        game_info.update_info(board.selected_pos, board.board, board.possible_moves)
+        if self.cancelled:
+            self.sub_title = "Search cancelled"
+            game_info.update_search(None, False)
+            return
+        if result.move is None:
+            self.sub_title = "Engine has no legal moves"
+            return
+
+        # only a move that's played costs clock time, a cancelled search
+        # gives the board back to the player for free
+        if self.clock_ms is not None:
+            self.clock_ms += self.increment_ms - result.seconds * 1000
+        board = self.query_one(ChessBoard)
+        is_white = board.position.white_to_move
+        board.play_move(*result.move)
+        self.query_one(MoveHistory).add_move(move_to_notation(result.move), is_white)
+        self.sub_title = f"Engine played {move_to_notation(result.move)}"
+        game_info.update_info(None, board.position, [])
+        game_info.update_search(result, False)
+        self.game_over()
+
+    def game_over(self) -> bool:
+        """Show the result if the side to move has no legal move left"""
+        position = self.query_one(ChessBoard).position
+        if has_legal_move(position):
+            return False
+        if is_in_check(position):
+            winner = "Black" if position.white_to_move else "White"
+            self.sub_title = f"Checkmate, {winner} wins"
+        else:
+            self.sub_title = "Stalemate, the game is drawn"
+        return True
+
+    def on_unmount(self) -> None:
+        # let a running search finish so the waiting worker thread can exit
+        self.cancel_search()
+        if self.owns_engine and self.engine is not None:
+            self.engine.close()
+
+    def cancel_search(self) -> None:
+        # drop the search in progress, its result won't be played
+        if self.thinking:
+            self.cancelled = True
+            self.engine.stop()
 
     def on_key(self, event: events.Key) -> None:
+        if event.key == "a":
+            if self.thinking:
+                self.engine.stop()  # move now, with the best move so far
+            else:
+                self.engine_move()
+            return
+        # any other key takes the board back from the engine
+        self.cancel_search()
+
         board = self.query_one(ChessBoard)
         game_info = self.query_one(GameInfo)
-        game_info.update_info(board.selected_pos, board.board, [])
+        game_info.update_info(board.selected_pos, board.position, [])
 
         # Initialize cursor if not set
         if board.selected_pos is None:
             board.selected_pos = (0, 0)
-            board.possible_moves = get_possible_moves(board.board, (0, 0))
+            board.possible_moves = board.preview.get_possible_moves(
+                board.position, (0, 0)
+            )
             board.refresh_highlights()
-            game_info.update_info(board.selected_pos, board.board, board.possible_moves)
+            game_info.update_info(
+                board.selected_pos, board.position, board.possible_moves
+            )
             return
 
         y, x = board.selected_pos
@@ -393,11 +571,33 @@ class Tanuki(App):
                     board.possible_moves = []
 
         if board.selected_pos is not None:
-            board.possible_moves = get_possible_moves(board.board, board.selected_pos)
+            board.possible_moves = board.preview.get_possible_moves(
+                board.position, board.selected_pos
+            )
         board.refresh_highlights()
-        game_info.update_info(board.selected_pos, board.board, board.possible_moves)
+        game_info.update_info(board.selected_pos, board.position, board.possible_moves)
 
 
 if __name__ == "__main__":
-    app = Tanuki()
-    app.run()
+    parser = argparse.ArgumentParser(description="Play tanuki in a Textual UI")
+    parser.add_argument("--fen", default=STARTING_FEN, help="start from this position")
+    add_engine_arguments(parser)
+    args = parser.parse_args()
+    try:
+        position_from_fen(args.fen)
+    except ValueError as e:
+        parser.error(str(e))
+
+    engine = BackgroundEngine(args.threads, args.hash, args.hash_replace)
+    app = Tanuki(
+        engine,
+        search_depth(args),
+        args.movetime,
+        args.clock * 1000 if args.clock is not None else None,
+        args.increment * 1000,
+        args.fen,
+    )
+    try:
+        app.run()
+    finally:
+        engine.close()
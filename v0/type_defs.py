@@ -9,6 +9,8 @@ class MoveType(Enum):
     ADVANCE = "Advance"
     CAPTURE = "Capture"
     DOUBLE_ADVANCE = "Double Advance"  # for pawn's first move
+    EN_PASSANT = "En Passant"
+    CASTLE = "Castle"
 
 
 Move = Tuple[BoardLoc, MoveType]
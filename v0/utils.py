@@ -1,51 +1,67 @@
-import os
+from bitboard import Position
+from pieces import (
+    BISHOP,
+    EMPTY,
+    IS_BLACK,
+    IS_WHITE,
+    KING,
+    KNIGHT,
+    PAWN,
+    PIECE_TYPES,
+    QUEEN,
+    ROOK,
+)
 from type_defs import Board, BoardLoc, Move, MoveType
 from typing import Tuple, Union
 
 
-def is_black_piece(piece: str) -> bool:
-    return piece in "♚♛♜♝♞♟"
+def is_black_piece(piece: int) -> bool:
+    return IS_BLACK[piece]
 
 
-def is_white_piece(piece: str) -> bool:
-    return piece in "♔♕♖♗♘♙"
+def is_white_piece(piece: int) -> bool:
+    return IS_WHITE[piece]
 
 
-def is_pawn(piece: str) -> bool:
-    return piece in "♙♟"
+def is_pawn(piece: int) -> bool:
+    return PIECE_TYPES[piece] == PAWN
 
 
-def is_bishop(piece: str) -> bool:
-    return piece in "♗♝"
+def is_bishop(piece: int) -> bool:
+    return PIECE_TYPES[piece] == BISHOP
 
 
-def is_knight(piece: str) -> bool:
-    return piece in "♘♞"
+def is_knight(piece: int) -> bool:
+    return PIECE_TYPES[piece] == KNIGHT
 
 
-def is_rook(piece: str) -> bool:
-    return piece in "♖♜"
+def is_rook(piece: int) -> bool:
+    return PIECE_TYPES[piece] == ROOK
 
 
-def is_queen(piece: str) -> bool:
-    return piece in "♕♛"
+def is_queen(piece: int) -> bool:
+    return PIECE_TYPES[piece] == QUEEN
+
+
+def is_king(piece: int) -> bool:
+    return PIECE_TYPES[piece] == KING
 
 
 def clear_screen():
-    os.system("cls" if os.name == "nt" else "clear")
+    # cursor home and erase the screen, no need to start a shell for it
+    print("\033[H\033[2J", end="", flush=True)
 
 
-def move_piece(board: Board, start: BoardLoc, end: BoardLoc):
-    board[end[0]][end[1]] = board[start[0]][start[1]]
-    board[start[0]][start[1]] = "."
+def move_piece(
+    position: Position, start: BoardLoc, end: BoardLoc, promotion: int = EMPTY
+):
+    # recorded on the position's undo stack, see Position.unmake_move
+    position.make_move(start[0] * 8 + start[1], end[0] * 8 + end[1], promotion)
 
 
-def teleport_piece(board: Board, start: BoardLoc, end: BoardLoc):
+def teleport_piece(position: Position, start: BoardLoc, end: BoardLoc):
     # Swap the pieces at start and end locations
-    board[start[0]][start[1]], board[end[0]][end[1]] = (
-        board[end[0]][end[1]],
-        board[start[0]][start[1]],
-    )
+    position.swap_pieces(start[0] * 8 + start[1], end[0] * 8 + end[1])
 
 
 def loc_to_notation(loc: BoardLoc) -> str:
@@ -77,69 +93,74 @@ FG_RED = "\033[31m"
 FG_BRIGHT_WHITE = "\033[97m"
 
 
-def print_colored_board(
+def format_board(
     board: Board,
     selected: Union[BoardLoc, None] = None,
     moves: Union[list[Move], None] = None,
-):
+) -> list[str]:
+    # the board as lines of text, the selected piece and its moves colored
     moves = moves or []
-    move_locs = {loc for loc, _ in moves}
     move_types = {loc: move_type for loc, move_type in moves}
 
-    print("    a b c d e f g h")
+    lines = ["    a b c d e f g h"]
     for i, row in enumerate(board):
-        print(f"{8 - i} |", end=" ")
+        cells = []
         for j, piece in enumerate(row):
             if piece != ".":  # If it's a piece, always use bright white
                 piece = f"{FG_BRIGHT_WHITE}{piece}{RESET}"
 
             if selected and (i, j) == selected:
                 # Highlight selected piece with green background
-                print(f"{BG_GREEN}{piece}{RESET}", end=" ")
-            elif (i, j) in move_locs:
+                cells.append(f"{BG_GREEN}{piece}{RESET}")
+            elif (i, j) in move_types:
                 move_type = move_types[(i, j)]
                 if board[i][j] == ".":
                     if move_type == MoveType.ADVANCE:
                         # Blue background for normal moves
-                        print(f"{BG_BLUE}•{RESET}", end=" ")
+                        cells.append(f"{BG_BLUE}•{RESET}")
                     elif move_type == MoveType.DOUBLE_ADVANCE:
                         # Different symbol for double advance
-                        print(f"{BG_BLUE}◊{RESET}", end=" ")
+                        cells.append(f"{BG_BLUE}◊{RESET}")
+                    elif move_type == MoveType.CASTLE:
+                        cells.append(f"{BG_BLUE}♜{RESET}")
+                    elif move_type == MoveType.EN_PASSANT:
+                        # the captured pawn isn't on this square
+                        cells.append(f"{BG_RED}•{RESET}")
                 else:  # Capture
-                    print(f"{BG_RED}{piece}{RESET}", end=" ")
+                    cells.append(f"{BG_RED}{piece}{RESET}")
             else:
                 # Normal pieces
-                print(piece, end=" ")
-        print(f"| {8 - i}")
-    print("    a b c d e f g h")
+                cells.append(piece)
+        lines.append(f"{8 - i} | {' '.join(cells)} | {8 - i}")
+    lines.append("    a b c d e f g h")
+    return lines
 
 
-def print_possible_moves(start_notation: str, moves: list[Move]):
-    print(f"\nPossible moves from {start_notation}:")
+def format_possible_moves(start_notation: str, moves: list[Move]) -> list[str]:
+    lines = ["", f"Possible moves from {start_notation}:"]
     for move, move_type in moves:
         end_notation = loc_to_notation(move)
-        if move_type == MoveType.CAPTURE:
-            print(
-                f"  {FG_RED}{start_notation}{end_notation}{RESET} ({move_type.value})"
-            )
-        elif move_type == MoveType.DOUBLE_ADVANCE:
-            print(
-                f"  {FG_BLUE}{start_notation}{end_notation}{RESET} ({move_type.value})"
-            )
-        else:  # normal advance
-            print(
-                f"  {FG_BLUE}{start_notation}{end_notation}{RESET} ({move_type.value})"
-            )
+        if move_type in (MoveType.CAPTURE, MoveType.EN_PASSANT):
+            color = FG_RED
+        else:  # normal or double advance, castling
+            color = FG_BLUE
+        lines.append(
+            f"  {color}{start_notation}{end_notation}{RESET} ({move_type.value})"
+        )
+    return lines
+
+
+def print_colored_board(
+    board: Board,
+    selected: Union[BoardLoc, None] = None,
+    moves: Union[list[Move], None] = None,
+):
+    print("\n".join(format_board(board, selected, moves)))
+
+
+def print_possible_moves(start_notation: str, moves: list[Move]):
+    print("\n".join(format_possible_moves(start_notation, moves)))
 
 
 def print_board(board: Board):
-    print("    a b c d e f g h")
-    for i, row in enumerate(board):
-        print(f"{8 - i} |", end=" ")
-        for piece in row:
-            if piece == ".":
-                print(piece, end=" ")
-            else:
-                print(f"{FG_BRIGHT_WHITE}{piece}{RESET}", end=" ")
-        print(f"| {8 - i}")
-    print("    a b c d e f g h")
+    print("\n".join(format_board(board)))
@@ -0,0 +1,296 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from fen import position_from_fen, read_fens
+from logic_check import is_valid_move
+from movegen import compare_with_reference, reference_moves
+from moves import move_end, move_start
+from pgn import Replay, read_games, replay_game
+from progress import Progress
+from utils import loc_to_notation
+
+# Archive validation: the PGN, FEN and EPD files under the given paths are
+# cut into shards of about --shard-size bytes, and a pool of worker
+# processes validates the shards. Every game of a PGN file is replayed (see
+# pgn.replay_game); for every position of a FEN or EPD file, the move
+# generator and is_valid_move are checked against legal moves worked out
+# independently (see validate_position). Each shard's statistics
+# go back to this process as soon as it's done, and are added up per file
+# and overall.
+#
+# Shards split files at arbitrary offsets; the readers move both ends to
+# the next game or line boundary, so every game is validated exactly once
+# and a single huge file keeps all the workers busy. Only a bounded number
+# of shards is handed out at a time, so memory stays flat however many
+# files there are, and a consumer that falls behind holds the workers back
+# instead of letting results pile up.
+
+FILE_KINDS = {".pgn": "pgn", ".fen": "fen", ".epd": "fen"}
+MAX_ERRORS = 10  # illegal moves reported per shard, the rest are only counted
+
+
+class Shard(NamedTuple):
+    path: str
+    start: int
+    end: int
+    count: int  # shards of this file
+
+
+class Stats(NamedTuple):
+    games: int = 0  # games, or positions in a FEN file
+    plies: int = 0  # moves played, or moves checked in a FEN file
+    illegal: int = 0  # games or positions with an illegal move
+    seconds: float = 0.0  # worker time
+    # "offset: error" for the first few, or why the file couldn't be read
+    errors: tuple[str, ...] = ()
+
+    def merge(self, other: "Stats") -> "Stats":
+        return Stats(
+            self.games + other.games,
+            self.plies + other.plies,
+            self.illegal + other.illegal,
+            self.seconds + other.seconds,
+            (self.errors + other.errors)[:MAX_ERRORS],
+        )
+
+
+def find_archives(paths: Iterable[str]) -> Iterator[str]:
+    # the files to validate: the given ones, and the known kinds of file in
+    # the given directories and below
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in FILE_KINDS:
+                    yield os.path.join(root, name)
+
+
+def find_shards(paths: Iterable[str], shard_size: int) -> Iterator[Shard]:
+    for path in find_archives(paths):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0  # the worker reports why it can't be read
+        starts = range(0, max(size, 1), shard_size)
+        for start in starts:
+            yield Shard(path, start, min(start + shard_size, size), len(starts))
+
+
+def validate_position(fen: str) -> tuple[int, str | None]:
+    """Check the rules against the legal moves of a FEN's position.
+
+    The legal moves are worked out the slow way (movegen.reference_moves,
+    every move played and tested); the move generator has to produce the
+    same moves, and is_valid_move has to accept each of them. Returns the
+    number of moves checked and the first problem, or the reason the FEN
+    itself is invalid.
+    """
+    try:
+        position = position_from_fen(fen)
+    except ValueError as e:
+        return 0, str(e)
+    problem = compare_with_reference(position)
+    if problem:
+        return 0, problem
+    is_white = position.white_to_move
+    moves = reference_moves(position)
+    for checked, move in enumerate(moves):
+        start, end = divmod(move_start(move), 8), divmod(move_end(move), 8)
+        try:
+            valid = is_valid_move(position, start, end, is_white)
+        except ValueError as e:
+            valid, reason = False, str(e)
+        else:
+            reason = "not a move"
+        if not valid:
+            notation = loc_to_notation(start) + loc_to_notation(end)
+            return checked, f"{notation} is legal, but is_valid_move says: {reason}"
+    return len(moves), None
+
+
+# set up in each worker by _start_worker
+_check = False
+
+
+def _start_worker(check: bool) -> None:
+    global _check
+    _check = check
+
+
+def validate_shard(shard: Shard) -> tuple[Shard, Stats]:
+    started = time.perf_counter()
+    games = plies = illegal = 0
+    errors = []
+    try:
+        if FILE_KINDS.get(os.path.splitext(shard.path)[1].lower()) == "fen":
+            epd = shard.path.lower().endswith(".epd")
+            for offset, line in read_fens(shard.path, shard.start, shard.end):
+                # EPD operations (bm, id, ...) follow the four position fields
+                fen = " ".join(line.split()[:4]) if epd else line
+                try:
+                    checked, error = validate_position(fen)
+                except Exception as e:
+                    # a record the rules choke on counts against it, and the
+                    # rest of the archive is still validated
+                    checked, error = 0, f"{type(e).__name__}: {e}"
+                games += 1
+                plies += checked
+                if error:
+                    illegal += 1
+                    if len(errors) < MAX_ERRORS:
+                        errors.append(f"{offset}: {error}")
+        else:
+            for game in read_games(shard.path, shard.start, shard.end):
+                try:
+                    replay = replay_game(game, _check)
+                except Exception as e:
+                    replay = Replay(0, f"{type(e).__name__}: {e}")
+                games += 1
+                plies += replay.plies
+                if replay.error:
+                    illegal += 1
+                    if len(errors) < MAX_ERRORS:
+                        errors.append(f"{game.offset}: {replay.error}")
+    except OSError as e:
+        # a missing or unreadable file is reported, and the others go on
+        errors.append(str(e))
+    seconds = time.perf_counter() - started
+    return shard, Stats(games, plies, illegal, seconds, tuple(errors))
+
+
+def validate_archives(
+    paths: Iterable[str],
+    workers: int,
+    shard_size: int = 16 << 20,
+    check: bool = False,
+    in_flight: int | None = None,
+) -> Iterator[tuple[Shard, Stats]]:
+    """Validate archives in parallel, yielding every shard's stats when done.
+
+    Shards finish in any order. At most in_flight shards (default: two per
+    worker) are out at a time; another one is only handed out once the
+    caller has taken a result.
+    """
+    slots = threading.Semaphore(in_flight or 2 * workers)
+    stopped = threading.Event()
+
+    def shards() -> Iterator[Shard]:
+        # runs in the pool's task thread, which blocks here while every
+        # slot is taken
+        for shard in find_shards(paths, shard_size):
+            while not slots.acquire(timeout=0.1):
+                if stopped.is_set():
+                    return
+            yield shard
+
+    with multiprocessing.Pool(
+        workers, initializer=_start_worker, initargs=(check,)
+    ) as pool:
+        try:
+            for result in pool.imap_unordered(validate_shard, shards()):
+                slots.release()
+                yield result
+        finally:
+            # let the task thread finish, or closing the pool waits for it
+            stopped.set()
+
+
+def validate_files(
+    paths: Iterable[str],
+    workers: int,
+    shard_size: int = 16 << 20,
+    check: bool = False,
+    in_flight: int | None = None,
+    on_shard: Callable[[Shard, Stats], None] | None = None,
+) -> Iterator[tuple[str, Stats]]:
+    """Validate archives in parallel, yielding each file's stats when done.
+
+    on_shard is called with every shard's stats as they come in. Only the
+    files with shards still out are kept here.
+    """
+    pending: dict[str, tuple[Stats, int]] = {}
+    results = validate_archives(paths, workers, shard_size, check, in_flight)
+    for shard, stats in results:
+        if on_shard is not None:
+            on_shard(shard, stats)
+        total, done = pending.pop(shard.path, (Stats(), 0))
+        total, done = total.merge(stats), done + 1
+        if done == shard.count:
+            yield shard.path, total
+        else:
+            pending[shard.path] = (total, done)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Validate PGN, FEN and EPD archives in parallel"
+    )
+    parser.add_argument("paths", nargs="+", help="files, or directories to search")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=float,
+        default=16,
+        metavar="MB",
+        help="size of the pieces files are cut into (default: 16)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="also check every PGN move against independently worked out moves",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="don't report progress on stderr"
+    )
+    args = parser.parse_args()
+
+    progress = Progress(None, unit="games")
+
+    def shard_done(shard: Shard, stats: Stats) -> None:
+        if not args.quiet:
+            progress.done += stats.games
+            progress.update()
+
+    total = Stats()
+    files = 0
+    started = time.perf_counter()
+    for path, stats in validate_files(
+        args.paths,
+        args.workers,
+        max(int(args.shard_size * (1 << 20)), 1),
+        args.check,
+        on_shard=shard_done,
+    ):
+        files += 1
+        total = total.merge(stats)
+        rate = stats.games / stats.seconds if stats.seconds else 0
+        print(
+            f"{path}: {stats.games} games, {stats.plies} plies, "
+            f"{stats.illegal} illegal, {rate:.0f} games/s per worker"
+        )
+        for error in stats.errors:
+            print(f"  {error}")
+    if not args.quiet:
+        progress.update(finished=True)
+    seconds = time.perf_counter() - started
+    print(
+        f"{files} files, {total.games} games, {total.plies} plies, "
+        f"{total.illegal} illegal in {seconds:.2f}s "
+        f"({total.games / seconds:.0f} games/s, "
+        f"{total.plies / seconds:.0f} plies/s)",
+        file=sys.stderr,
+    )
+    sys.exit(1 if total.illegal or total.errors else 0)
@@ -0,0 +1,45 @@
+import random
+
+from pieces import EMPTY, PIECES
+
+# Zobrist keys: one random 64-bit number per (piece, square), plus keys for
+# the side to move, each castling rights mask and the en passant file. A
+# position's hash is the XOR of the keys for everything in it, so a move
+# only has to XOR out what changed and XOR in what's new.
+# fixed seed so hashes are stable across runs
+_rng = random.Random(0x7A4E0C1)
+
+
+def _key() -> int:
+    return _rng.getrandbits(64)
+
+
+# indexed by [piece code][square]; the unused codes get no keys
+PIECE_KEYS: list[list[int]] = [[0] * 64 for _ in range(16)]
+for _piece in PIECES:
+    PIECE_KEYS[_piece] = [_key() for _ in range(64)]
+BLACK_TO_MOVE_KEY = _key()
+EP_FILE_KEYS = [_key() for _ in range(8)]
+
+# one key per castling right, combined for every possible rights mask
+_CASTLING_RIGHT_KEYS = [_key() for _ in range(4)]
+CASTLING_KEYS = [0] * 16
+for _mask in range(16):
+    for _bit in range(4):
+        if _mask & (1 << _bit):
+            CASTLING_KEYS[_mask] ^= _CASTLING_RIGHT_KEYS[_bit]
+
+
+def compute_hash(position) -> int:
+    # full O(64) computation, used when a position is first loaded and to
+    # verify the incrementally maintained hash
+    key = 0
+    for square, piece in enumerate(position.squares):
+        if piece != EMPTY:
+            key ^= PIECE_KEYS[piece][square]
+    if not position.white_to_move:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[position.castling]
+    if position.ep_square >= 0:
+        key ^= EP_FILE_KEYS[position.ep_square & 7]
+    return key